@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Listing and dump benchmarks against local fake Gitlab: wall time, API requests and peak RSS per scenario.
+
+Usage: python3 benchmarks/cli.py [--groups 100] [--projects 1000] [--jobs 8] [--latency 0] [--only dump-clone]
+"""
+
+import argparse
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import tempfile
+import time
+
+from fake_gitlab import FakeGitlabServer, FakeInstance
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = {
+    "projects-list": ["projects", "list"],
+    "tree": ["tree"],
+    "groups-list-subgroups": ["groups", "list", "--subgroups"],
+    "dump-clone": ["projects", "dump", "--jobs", "{jobs}"],
+    "dump-archive": ["projects", "dump", "--as-archive", "--jobs", "{jobs}"],
+}
+
+
+def run_cli(args: list[str], env: dict[str, str]) -> tuple[float, int, int]:
+    """Run CLI in subprocess, returns wall time, exit code and peak RSS in KB (including git children)."""
+    with tempfile.TemporaryFile() as output:
+        started_at = time.perf_counter()
+        process = subprocess.Popen(  # nosec
+            [sys.executable, "-m", "src.main", *args], cwd=ROOT, env=env, stdout=output, stderr=output
+        )
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - started_at
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if process.returncode != 0:
+            output.seek(0)
+            sys.stderr.write(output.read().decode(errors="replace")[-2000:])
+    return elapsed, process.returncode, usage.ru_maxrss
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--remotes", type=int, default=4, help="Size of git remotes pool shared by projects.")
+    parser.add_argument("--jobs", type=int, default=8, help="Dump workers.")
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency of API responses in ms.")
+    parser.add_argument("--only", action="append", choices=sorted(SCENARIOS), help="Run only these scenarios.")
+    parser.add_argument("--cache", action="store_true", help="Keep metadata cache enabled.")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="gitlab-dumper-bench-")
+    remotes_dir = os.path.join(work_dir, "remotes")
+    os.makedirs(remotes_dir)
+
+    started_at = time.perf_counter()
+    instance = FakeInstance(args.groups, args.projects, remotes_dir, remotes=args.remotes)
+    print(
+        f"instance: {args.groups} groups, {args.projects} projects, built in {time.perf_counter() - started_at:.1f}s"
+    )
+    print(f"{'scenario':<24} {'wall':>9} {'requests':>9} {'peak rss':>10}  status")
+
+    try:
+        with FakeGitlabServer(instance, latency=args.latency / 1000) as server:
+            for name in args.only or SCENARIOS:
+                dumps_dir = os.path.join(work_dir, "dumps", name)
+                env = {
+                    **os.environ,
+                    "GITLAB_URL": server.url,
+                    "GITLAB_PERSONAL_TOKEN": "bench",
+                    "DEFAULT_DUMP_DIR": dumps_dir,
+                    "CACHE_PATH": os.path.join(work_dir, f"{name}.sqlite"),
+                    "CACHE_TTL": os.environ.get("CACHE_TTL", "900") if args.cache else "0",
+                    "API_RATE_LIMIT": os.environ.get("API_RATE_LIMIT", "10000"),
+                    "API_RATE_BURST": os.environ.get("API_RATE_BURST", "1000"),
+                    "LOG_LEVEL": "warning",
+                }
+                cli_args = [arg.format(jobs=args.jobs) for arg in SCENARIOS[name]]
+
+                server.requests.clear()
+                elapsed, code, max_rss = run_cli(cli_args, env)
+                requests = sum(server.requests.values())
+                status = "ok" if code == 0 else f"exit {code}"
+                print(f"{name:<24} {elapsed:>8.2f}s {requests:>9} {max_rss / 1024:>8.1f}MB  {status}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
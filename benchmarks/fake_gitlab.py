@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for Gitlab API v4 with synthetic groups and projects, backed by local git remotes.
+
+Only endpoints used by gitlab-dumper are served: paginated /groups, /projects, group projects and subgroups,
+branches and repository archives. Projects share a small pool of bare repos, so instances with thousands
+of projects are generated in seconds.
+
+Usage: python3 benchmarks/fake_gitlab.py [--groups 100] [--projects 1000] [--port 8765]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import subprocess  # nosec
+import tempfile
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+LAST_ACTIVITY_AT = "2024-01-01T00:00:00Z"
+
+
+def create_remote(path: str, commits: int, files: int) -> None:
+    """Create bare repo with linear history of `commits` commits touching `files` files."""
+    work_dir = tempfile.mkdtemp(prefix="fake-gitlab-work-")
+    git = ["git", "-c", "user.name=bench", "-c", "user.email=bench@localhost", "-C", work_dir]
+
+    subprocess.run(["git", "init", "-q", "-b", "main", work_dir], check=True)  # nosec
+    for commit in range(commits):
+        for i in range(files):
+            with open(os.path.join(work_dir, f"file_{i}.txt"), "a") as fh:
+                fh.write(f"{commit} {os.urandom(64).hex()}\n")
+        subprocess.run([*git, "add", "-A"], check=True)  # nosec
+        subprocess.run([*git, "commit", "-q", "-m", f"commit {commit}"], check=True)  # nosec
+
+    subprocess.run(["git", "clone", "-q", "--bare", work_dir, path], check=True)  # nosec
+    subprocess.run(["rm", "-rf", work_dir], check=True)  # nosec
+
+
+class FakeInstance:
+    """Synthetic Gitlab instance: groups tree, projects and pool of bare git remotes."""
+
+    def __init__(
+        self,
+        groups: int,
+        projects: int,
+        remotes_dir: str,
+        remotes: int = 4,
+        commits: int = 20,
+        files: int = 10,
+        seed: int = 42,
+    ) -> None:
+        rng = random.Random(seed)
+        self.remotes = []
+        for i in range(remotes):
+            path = os.path.join(remotes_dir, f"remote_{i}.git")
+            if not os.path.exists(path):
+                create_remote(path, commits, files)
+            self.remotes.append(path)
+
+        self.groups: list[dict] = []
+        top_level = max(groups // 4, 1)
+        for i in range(1, groups + 1):
+            parent = None if i <= top_level else self.groups[rng.randrange(i - 1)]
+            path = f"group-{i}"
+            full_path = path if parent is None else f"{parent['full_path']}/{path}"
+            self.groups.append(
+                {
+                    "id": i,
+                    "name": path,
+                    "path": path,
+                    "full_path": full_path,
+                    "parent_id": parent["id"] if parent else None,
+                    "web_url": f"http://gitlab.local/groups/{full_path}",
+                }
+            )
+
+        self.projects: list[dict] = []
+        for i in range(1, projects + 1):
+            group = self.groups[rng.randrange(len(self.groups))]
+            remote = self.remotes[i % len(self.remotes)]
+            path = f"project-{i}"
+            self.projects.append(
+                {
+                    "id": 1000 + i,
+                    "name": path,
+                    "path": path,
+                    "path_with_namespace": f"{group['full_path']}/{path}",
+                    "namespace": {
+                        "id": group["id"],
+                        "path": group["path"],
+                        "full_path": group["full_path"],
+                        "kind": "group",
+                    },
+                    "ssh_url_to_repo": f"file://{remote}",
+                    "http_url_to_repo": f"file://{remote}",
+                    "web_url": f"http://gitlab.local/{group['full_path']}/{path}",
+                    "default_branch": "main",
+                    "empty_repo": False,
+                    "archived": False,
+                    "last_activity_at": LAST_ACTIVITY_AT,
+                    "forked_from_project": None,
+                    "statistics": {"repository_size": rng.randrange(10_000, 50_000_000)},
+                }
+            )
+
+        self.groups_by_key = {str(g["id"]): g for g in self.groups} | {g["full_path"]: g for g in self.groups}
+        self.projects_by_id = {p["id"]: p for p in self.projects}
+        self._heads: dict[str, str] = {}
+        self._archives: dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def head(self, remote: str) -> str:
+        with self._lock:
+            if remote not in self._heads:
+                self._heads[remote] = (
+                    subprocess.check_output(["git", "-C", remote, "rev-parse", "HEAD"]).decode().strip()  # nosec
+                )
+            return self._heads[remote]
+
+    def archive(self, remote: str) -> bytes:
+        """Archives are built once per remote, server load shouldn't be part of measurement."""
+        with self._lock:
+            if remote not in self._archives:
+                self._archives[remote] = subprocess.check_output(  # nosec
+                    ["git", "-C", remote, "archive", "--format=tar.gz", "HEAD"]
+                )
+            return self._archives[remote]
+
+
+def make_handler(instance: FakeInstance, requests: Counter, latency: float = 0.0) -> type:  # noqa: C901
+    """Returns request handler class bound to instance, requests are counted by endpoint."""
+
+    class FakeGitlabHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def send_json(self, data: object, status: int = 200, headers: dict | None = None) -> None:
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_page(self, items: list, query: dict) -> None:
+            per_page = min(int(query.get("per_page", 20)), 100)
+            page = int(query.get("page", 1))
+            total_pages = max(-(-len(items) // per_page), 1)
+            headers = {
+                "X-Page": str(page),
+                "X-Per-Page": str(per_page),
+                "X-Total": str(len(items)),
+                "X-Total-Pages": str(total_pages),
+            }
+            if page < total_pages:
+                next_query = urlencode({**query, "page": page + 1})
+                headers["X-Next-Page"] = str(page + 1)
+                headers["Link"] = f'<http://{self.headers["Host"]}{urlparse(self.path).path}?{next_query}>; rel="next"'
+            self.send_json(items[(page - 1) * per_page : page * per_page], headers=headers)
+
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+            path = url.path.removeprefix("/api/v4")
+            if latency:
+                time.sleep(latency)
+
+            if path == "/groups":
+                requests["groups"] += 1
+                return self.send_page(instance.groups, query)
+
+            if path == "/projects":
+                requests["projects"] += 1
+                projects = instance.projects
+                if "last_activity_after" in query:
+                    since = query["last_activity_after"].replace("+00:00", "Z")
+                    projects = [p for p in projects if p["last_activity_at"] > since]
+                return self.send_page(projects, query)
+
+            if match := re.fullmatch(r"/groups/([^/]+)(/projects|/subgroups)?", path):
+                requests["group" + (match.group(2) or "")] += 1
+                group = instance.groups_by_key.get(unquote(match.group(1)))
+                if group is None:
+                    return self.send_json({"message": "404 Group Not Found"}, 404)
+                if match.group(2) is None:
+                    return self.send_json(group)
+                if match.group(2) == "/subgroups":
+                    return self.send_page([g for g in instance.groups if g["parent_id"] == group["id"]], query)
+
+                include_subgroups = query.get("include_subgroups", "false").lower() == "true"
+                return self.send_page(
+                    [
+                        p
+                        for p in instance.projects
+                        if p["namespace"]["id"] == group["id"]
+                        or (include_subgroups and p["namespace"]["full_path"].startswith(f"{group['full_path']}/"))
+                    ],
+                    query,
+                )
+
+            if match := re.fullmatch(r"/projects/(\d+)/repository/(branches/.+|archive.*)", path):
+                project = instance.projects_by_id.get(int(match.group(1)))
+                if project is None:
+                    return self.send_json({"message": "404 Project Not Found"}, 404)
+
+                remote = project["ssh_url_to_repo"].removeprefix("file://")
+                if match.group(2).startswith("branches/"):
+                    requests["branches"] += 1
+                    return self.send_json({"name": "main", "commit": {"id": instance.head(remote)}})
+
+                requests["archive"] += 1
+                data = instance.archive(remote)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            requests["not_found"] += 1
+            self.send_json({"message": "404 Not Found"}, 404)
+
+    return FakeGitlabHandler
+
+
+class FakeGitlabServer:
+    """Fake Gitlab served from background thread, use as context manager."""
+
+    def __init__(self, instance: FakeInstance, port: int = 0, latency: float = 0.0) -> None:
+        self.requests: Counter = Counter()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(instance, self.requests, latency))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "FakeGitlabServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", type=int, default=100)
+    parser.add_argument("--projects", type=int, default=1000)
+    parser.add_argument("--remotes", type=int, default=4, help="Size of git remotes pool shared by projects.")
+    parser.add_argument("--remotes-dir", default=os.path.join(tempfile.gettempdir(), "fake-gitlab-remotes"))
+    parser.add_argument("--latency", type=float, default=0.0, help="Added latency of API responses in ms.")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    os.makedirs(args.remotes_dir, exist_ok=True)
+    instance = FakeInstance(args.groups, args.projects, args.remotes_dir, remotes=args.remotes)
+    with FakeGitlabServer(instance, port=args.port, latency=args.latency / 1000) as server:
+        print(f"Fake Gitlab with {args.groups} groups and {args.projects} projects: GITLAB_URL={server.url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+CLI startup benchmark: wall time of light invocations and the heaviest imports.
+
+Usage: python3 benchmarks/startup.py [--runs 20] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess  # nosec
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INVOCATIONS = (
+    ["--help"],
+    ["--version"],
+    ["projects", "--help"],
+    ["projects", "dump", "--help"],
+)
+
+
+def measure(args: list[str], runs: int) -> list[float]:
+    timings = []
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.main", *args], cwd=ROOT, capture_output=True, check=True)  # nosec
+        timings.append(time.perf_counter() - started_at)
+    return timings
+
+
+def heaviest_imports(args: list[str], top: int) -> list[tuple[int, str]]:
+    """Parse -X importtime output, returns (cumulative microseconds, module) sorted desc."""
+    result = subprocess.run(  # nosec
+        [sys.executable, "-X", "importtime", "-m", "src.main", *args], cwd=ROOT, capture_output=True, text=True
+    )
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        imports.append((int(cumulative), module.rstrip()))
+    return sorted(imports, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    measure(["--version"], 1)  # warm up filesystem caches
+
+    python_only = []
+    for _ in range(args.runs):
+        started_at = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)  # nosec
+        python_only.append(time.perf_counter() - started_at)
+
+    print(f"{'invocation':<28} {'median':>9} {'min':>9}")
+    print(f"{'python -c pass':<28} {statistics.median(python_only) * 1000:>7.1f}ms {min(python_only) * 1000:>7.1f}ms")
+    for invocation in INVOCATIONS:
+        timings = measure(invocation, args.runs)
+        name = " ".join(invocation)
+        print(f"{name:<28} {statistics.median(timings) * 1000:>7.1f}ms {min(timings) * 1000:>7.1f}ms")
+
+    print("")
+    print("heaviest imports of --help (cumulative):")
+    for cumulative, module in heaviest_imports(["--help"], args.top):
+        print(f"  {cumulative / 1000:>8.1f}ms {module}")
+
+
+if __name__ == "__main__":
+    main()
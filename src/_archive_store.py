@@ -0,0 +1,153 @@
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from src._settings import get_logger
+from src._utils import parse_datetime, safe_resolve_path
+
+logger = get_logger()
+
+ARCHIVE_STORE_DIRNAME = ".archives"
+ARCHIVE_INDEX_FILENAME = "index.json"
+
+
+@dataclass
+class RetentionPolicy:
+    """Which snapshots to keep, all snapshots are kept if no rule is set."""
+
+    keep_last: int | None = None
+    keep_daily: int | None = None
+    keep_weekly: int | None = None
+
+    @property
+    def is_empty(self) -> bool:
+        return not (self.keep_last or self.keep_daily or self.keep_weekly)
+
+
+@dataclass
+class Snapshot:
+    """Archive of default branch at the moment of dump."""
+
+    taken_at: str
+    sha: str
+
+
+@dataclass
+class ArchiveIndex:
+    """Snapshots of a single project and checksums of stored archives by commit SHA."""
+
+    snapshots: list[Snapshot] = field(default_factory=list)
+    objects: dict[str, str] = field(default_factory=dict)
+
+
+def _keep_by_period(snapshots: list[Snapshot], count: int, period_key) -> set[int]:
+    """Indexes of the newest snapshot of each of the last `count` periods, snapshots are sorted newest first."""
+    kept, seen = set(), set()
+    for i, snapshot in enumerate(snapshots):
+        key = period_key(parse_datetime(snapshot.taken_at))
+        if key in seen:
+            continue
+        if len(seen) == count:
+            break
+        seen.add(key)
+        kept.add(i)
+    return kept
+
+
+def apply_retention(snapshots: list[Snapshot], policy: RetentionPolicy) -> list[Snapshot]:
+    """
+    Returns snapshots to keep, snapshots are passed and returned in order of dumps (the oldest first).
+    Rules are combined, snapshot is kept if any rule keeps it.
+    """
+    if policy.is_empty:
+        return list(snapshots)
+
+    newest_first = list(reversed(snapshots))
+    kept = set(range(min(policy.keep_last or 0, len(newest_first))))
+    if policy.keep_daily:
+        kept |= _keep_by_period(newest_first, policy.keep_daily, lambda dt: dt.date())
+    if policy.keep_weekly:
+        kept |= _keep_by_period(newest_first, policy.keep_weekly, lambda dt: dt.isocalendar()[:2])
+
+    return [snapshot for i, snapshot in reversed(list(enumerate(newest_first))) if i in kept]
+
+
+class ArchiveStore:
+    """
+    Content-addressed store of project archives: <dumps>/.archives/<project id>/<commit sha>.<format>.
+    Archive is downloaded once per commit, every dump adds a snapshot to the project index,
+    archives not referenced by kept snapshots are removed by retention.
+    """
+
+    def __init__(self, dumps_base_dir: str, policy: RetentionPolicy | None = None) -> None:
+        self.path = os.path.join(safe_resolve_path(dumps_base_dir), ARCHIVE_STORE_DIRNAME)
+        self.policy = policy or RetentionPolicy()
+
+    def project_dir(self, project_id: int) -> str:
+        return os.path.join(self.path, str(project_id))
+
+    def object_path(self, project_id: int, sha: str, archive_format: str = "tar.gz") -> str:
+        return os.path.join(self.project_dir(project_id), f"{sha}.{archive_format}")
+
+    def load_index(self, project_id: int) -> ArchiveIndex:
+        index_path = os.path.join(self.project_dir(project_id), ARCHIVE_INDEX_FILENAME)
+        if not os.path.exists(index_path):
+            return ArchiveIndex()
+
+        try:
+            with open(index_path, "r") as fh:
+                data = json.load(fh)
+            return ArchiveIndex(
+                snapshots=[Snapshot(**raw) for raw in data.get("snapshots", [])], objects=data.get("objects", {})
+            )
+        except (ValueError, TypeError) as e:
+            logger.warning("Can't read archive index %s, starting a new one: %s", index_path, e)
+            return ArchiveIndex()
+
+    def save_index(self, project_id: int, index: ArchiveIndex) -> None:
+        index_path = os.path.join(self.project_dir(project_id), ARCHIVE_INDEX_FILENAME)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(asdict(index), fh, indent=2)
+        os.replace(tmp_path, index_path)
+
+    def add_snapshot(self, project_id: int, sha: str, checksum: str, archive_format: str = "tar.gz") -> None:
+        """Register snapshot of stored archive and drop snapshots and archives out of retention."""
+        index = self.load_index(project_id)
+        index.objects[sha] = checksum
+        index.snapshots.append(Snapshot(taken_at=datetime.now(timezone.utc).isoformat(timespec="seconds"), sha=sha))
+        index.snapshots = apply_retention(index.snapshots, self.policy)
+
+        referenced = {snapshot.sha for snapshot in index.snapshots}
+        for stale_sha in set(index.objects) - referenced:
+            stale_path = self.object_path(project_id, stale_sha, archive_format)
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+            del index.objects[stale_sha]
+            logger.debug("Archive %s is out of retention, removed", stale_path)
+
+        self.save_index(project_id, index)
+
+    def publish(self, project_id: int, sha: str, link_path: str, archive_format: str = "tar.gz") -> None:
+        """Expose stored archive at the usual dump path by hardlink, copy is not needed."""
+        os.makedirs(os.path.dirname(link_path), exist_ok=True)
+        object_path = self.object_path(project_id, sha, archive_format)
+        tmp_path = f"{link_path}.tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+
+        if os.path.exists(link_path) and os.path.samefile(object_path, link_path):
+            # rename() of a hardlink over the same inode is a no-op and would leave tmp file behind
+            return
+
+        try:
+            os.link(object_path, tmp_path)
+        except OSError:
+            os.symlink(os.path.relpath(object_path, os.path.dirname(link_path)), tmp_path)
+        os.replace(tmp_path, link_path)
+
+
+__all__ = ["ArchiveIndex", "ArchiveStore", "RetentionPolicy", "Snapshot", "apply_retention"]
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Iterable, Iterator, Literal
+
+from src._settings import get_logger
+from src._utils import safe_resolve_path
+
+logger = get_logger()
+
+CACHE_SCHEMA_VERSION = "2"  # 2: compact records instead of raw API payload
+CacheKind = Literal["groups", "projects"]
+
+
+class MetadataCache:
+    """
+    SQLite cache of Gitlab groups and projects listings.
+    Visibility of listings depends on token, so cache is bound to the endpoint and fingerprint of the token.
+    """
+
+    def __init__(self, path: str, endpoint: str, ttl: int, full_scan_ttl: int, token: str | None = None) -> None:
+        self.path = safe_resolve_path(path)
+        self.endpoint = endpoint
+        # hash only, the token itself is never written to the cache
+        self.credential = hashlib.sha256((token or "").encode()).hexdigest()
+        self.ttl = ttl
+        self.full_scan_ttl = full_scan_ttl
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            self._init_schema(connection)
+            self._initialized = True
+        return connection
+
+    def _init_schema(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS groups (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS projects (id INTEGER PRIMARY KEY, data TEXT NOT NULL);
+                """
+            )
+            meta = dict(connection.execute("SELECT key, value FROM meta").fetchall())
+            expected = {"schema": CACHE_SCHEMA_VERSION, "endpoint": self.endpoint, "credential": self.credential}
+
+            if any(meta.get(key) != value for key, value in expected.items()):
+                # cache created by another version, for another instance or token, start from scratch
+                logger.debug("Resetting metadata cache %s", self.path)
+                connection.executescript("DELETE FROM meta; DELETE FROM groups; DELETE FROM projects;")
+                connection.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", expected.items())
+
+    def _get_meta(self, key: str) -> str | None:
+        with closing(self._connect()) as connection:
+            row = connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def synced_at(self, kind: CacheKind) -> float | None:
+        """Returns timestamp of the last full or delta sync."""
+        value = self._get_meta(f"{kind}_synced_at")
+        return float(value) if value is not None else None
+
+    def is_fresh(self, kind: CacheKind) -> bool:
+        synced_at = self.synced_at(kind)
+        return synced_at is not None and time.time() - synced_at < self.ttl
+
+    def needs_full_scan(self, kind: CacheKind) -> bool:
+        value = self._get_meta(f"{kind}_full_scan_at")
+        return value is None or time.time() - float(value) >= self.full_scan_ttl
+
+    def store(self, kind: CacheKind, items: Iterable[dict[str, Any]], started_at: float, full: bool) -> None:
+        """
+        Save listing to cache. Full listing replaces the table, otherwise items are upserted.
+        started_at is time when listing was requested, so changes made during pagination are caught next time.
+        """
+        rows = ((item["id"], json.dumps(item)) for item in items)
+
+        with closing(self._connect()) as connection, connection:
+            if full:
+                connection.execute(f"DELETE FROM {kind}")  # nosec: kind is a literal
+                connection.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f"{kind}_full_scan_at", str(started_at))
+                )
+            connection.executemany(f"INSERT OR REPLACE INTO {kind} (id, data) VALUES (?, ?)", rows)  # nosec
+            connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (f"{kind}_synced_at", str(started_at))
+            )
+
+    def load(self, kind: CacheKind) -> Iterator[dict[str, Any]]:
+        """Returns iterator over cached items ordered by id."""
+        with closing(self._connect()) as connection:
+            for (data,) in connection.execute(f"SELECT data FROM {kind} ORDER BY id"):  # nosec
+                yield json.loads(data)
+
+
+def get_metadata_cache(
+    path: str, endpoint: str, ttl: int, full_scan_ttl: int, token: str | None = None
+) -> MetadataCache | None:
+    """Returns cache object or None if cache disabled."""
+    if ttl <= 0:
+        return None
+    return MetadataCache(path, endpoint=endpoint, ttl=ttl, full_scan_ttl=full_scan_ttl, token=token)
+
+
+__all__ = ["MetadataCache", "get_metadata_cache"]
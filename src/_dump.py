@@ -0,0 +1,337 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Iterable, Literal
+
+from src._archive_store import ArchiveStore, RetentionPolicy
+from src._settings import get_logger
+from src._git import (
+    CloneOptions,
+    clone_or_update_repo,
+    get_archive_destination,
+    get_repo_destination,
+    save_repo_as_archive,
+    save_repo_to_archive_store,
+    TransportLimits,
+)
+from src._journal import DumpJournal
+from src._logging import log_context
+from src._manifest import DumpManifest, DumpMode
+from src._pool import ObjectPools
+from src._records import ProjectRecord
+from src._shard import ClaimQueue, in_shard
+from src._telemetry import ProjectStats, RunReport
+
+from gitlab import Gitlab
+
+logger = get_logger()
+
+DumpOrder = Literal["size", "listing"]
+
+# how often manifest and journal are saved while dump is running, seconds
+CHECKPOINT_INTERVAL = 30
+
+
+@dataclass
+class DumpOptions:
+    """Parameters of dump run."""
+
+    dumps_dir: str
+    mode: DumpMode = "clone"
+    dry_run: bool = False
+    skip_empty: bool = False
+    incremental: bool = False
+    jobs: int = 1
+    api_jobs: int | None = None
+    git_jobs: int | None = None
+    shard: tuple[int, int] | None = None  # (index, total), index is 1-based
+    queue_dir: str | None = None
+    run_id: str | None = None
+    order: DumpOrder = "size"
+    clone: CloneOptions = field(default_factory=CloneOptions)
+    archive_store: bool = False
+    retention: RetentionPolicy = field(default_factory=RetentionPolicy)
+    resume: bool = False
+    object_pool: bool = False
+
+    @property
+    def manifest_part(self) -> str | None:
+        """Name of manifest part for runs which share dumps dir with other hosts."""
+        if self.shard is not None:
+            return f"shard-{self.shard[0]}-of-{self.shard[1]}"
+        if self.queue_dir is not None:
+            # processes of the same host share the part, it is merged on save
+            return f"host-{socket.gethostname()}"
+        return None
+
+    @property
+    def journal_prefix(self) -> str | None:
+        """Several queue workers may run on the same host, each of them has own journal named by pid."""
+        if self.shard is None and self.queue_dir is not None:
+            return f"host-{socket.gethostname()}-"
+        return None
+
+    @property
+    def journal_name(self) -> str:
+        if self.shard is not None:
+            return f"shard-{self.shard[0]}-of-{self.shard[1]}"
+        if self.journal_prefix is not None:
+            return f"{self.journal_prefix}{os.getpid()}"
+        return "default"
+
+
+def dump_project(
+    gl: Gitlab,
+    project: ProjectRecord,
+    options: DumpOptions,
+    limits: TransportLimits,
+    manifest: DumpManifest,
+    stats: ProjectStats,
+    queue: ClaimQueue | None = None,
+    pools: ObjectPools | None = None,
+) -> None:
+    """Clone or download single project and record result to manifest, runs inside dump worker."""
+    with log_context(project_id=project.id, project=project.path_with_namespace):
+        _dump_project(gl, project, options, limits, manifest, stats, queue, pools)
+
+        for phase, duration in stats.durations.items():
+            if phase != "total":
+                logger.debug(
+                    "Repo %s %s took %.2fs",
+                    project.path_with_namespace,
+                    phase,
+                    duration,
+                    extra={"phase": phase, "duration": duration},
+                )
+        if "total" in stats.durations and stats.status != "skipped":
+            logger.info(
+                "Repo %s done in %.2fs",
+                project.path_with_namespace,
+                stats.durations["total"],
+                extra={"phase": "total", "duration": stats.durations["total"]},
+            )
+
+
+def _dump_project(
+    gl: Gitlab,
+    project: ProjectRecord,
+    options: DumpOptions,
+    limits: TransportLimits,
+    manifest: DumpManifest,
+    stats: ProjectStats,
+    queue: ClaimQueue | None,
+    pools: ObjectPools | None,
+) -> None:
+    dumps_dir, dry_run = options.dumps_dir, options.dry_run
+
+    # claim right before work starts, so idle hosts pick up projects not taken by others yet
+    if queue is not None and not dry_run and not queue.claim(project.id):
+        logger.debug("Repo %s claimed by another worker, skipping", project.path_with_namespace)
+        stats.status = "skipped"
+        return
+
+    try:
+        with stats.measure("total"):
+            if options.mode == "archive" and options.archive_store:
+                store = ArchiveStore(dumps_dir, options.retention)
+                stored = save_repo_to_archive_store(
+                    gl, project, dumps_dir, store, dry_run=dry_run, limits=limits, stats=stats
+                )
+                if stored is not None:
+                    sha, checksum = stored
+                    manifest.record(
+                        project, "archive", _destination(project, options), head_sha=sha, archive_checksum=checksum
+                    )
+            elif options.mode == "archive":
+                checksum = save_repo_as_archive(gl, project, dumps_dir, dry_run=dry_run, limits=limits, stats=stats)
+                if checksum is not None:
+                    manifest.record(project, "archive", _destination(project, options), archive_checksum=checksum)
+            else:
+                mirror = options.mode == "mirror"
+                head_sha = clone_or_update_repo(
+                    project,
+                    dumps_dir,
+                    dry_run=dry_run,
+                    limits=limits,
+                    mirror=mirror,
+                    stats=stats,
+                    clone_options=options.clone,
+                    pools=pools,
+                )
+                if not dry_run:
+                    manifest.record(project, options.mode, _destination(project, options), head_sha=head_sha)
+    except Exception:
+        if queue is not None and not dry_run:
+            # failed project goes back to the queue, so another worker can take it
+            queue.release(project.id)
+        raise
+
+
+def _destination(project: ProjectRecord, options: DumpOptions) -> str:
+    """Path of project dump recorded to manifest."""
+    if options.mode == "archive":
+        return get_archive_destination(project, options.dumps_dir)
+    return get_repo_destination(project, options.dumps_dir, mirror=options.mode == "mirror")
+
+
+def project_size(project: ProjectRecord) -> int:
+    """Repository size from project statistics, 0 if statistics are not available."""
+    return project.repository_size or 0
+
+
+def _open_journal(
+    projects: Iterable[ProjectRecord], options: DumpOptions
+) -> tuple[DumpJournal, Iterable[ProjectRecord], set[int]]:
+    """Start new journal or continue the interrupted one. Returns journal, listing and ids of completed projects."""
+    journal = None
+    if options.resume and options.journal_prefix is not None:
+        # journal of any dead worker of this host is continued, concurrent resumes pick different ones
+        journal = DumpJournal.find_interrupted(options.dumps_dir, options.journal_prefix)
+    if journal is None:
+        journal = DumpJournal(options.dumps_dir, options.journal_name)
+        if not journal.lock():
+            raise RuntimeError(f"Another dump is running with journal {journal.path}")
+
+    if not options.resume or not journal.exists():
+        if options.resume:
+            logger.warning("No interrupted dump found, starting from scratch")
+        journal.start(options.mode)
+        return journal, journal.record_listing(projects), set()
+
+    if journal.mode != options.mode:
+        raise RuntimeError(f"Interrupted dump was run in {journal.mode} mode, can't resume it in {options.mode} mode")
+
+    done_ids = journal.done_ids()
+    if journal.listing_complete:
+        logger.info("Resuming dump, %d projects already done, listing is loaded from journal", len(done_ids))
+        return journal, journal.load_listing(), done_ids
+
+    logger.info("Resuming dump, %d projects already done, listing was interrupted and is fetched again", len(done_ids))
+    journal.reopen_listing()
+    return journal, journal.record_listing(projects), done_ids
+
+
+def _select_projects(
+    projects: Iterable[ProjectRecord],
+    options: DumpOptions,
+    manifest: DumpManifest,
+    report: RunReport,
+    done_ids: set[int],
+    pools: ObjectPools | None = None,
+) -> list[tuple[ProjectRecord, ProjectStats]]:
+    """Consume listing and returns projects to dump in order of dispatch, skipped projects are added to report."""
+    pending: list[tuple[ProjectRecord, ProjectStats]] = []
+    for project in projects:
+        if pools is not None:
+            # fork networks are built from the whole listing, also from projects of other shards
+            pools.add(project)
+
+        if options.shard is not None and not in_shard(project.id, *options.shard):
+            continue
+
+        if project.id in done_ids:
+            continue
+
+        stats = ProjectStats(project_id=project.id, path_with_namespace=project.path_with_namespace)
+        stats.mode = options.mode
+        report.add(stats)
+
+        if project.empty_repo and options.skip_empty:
+            logger.info("Repo %s is empty, ignoring", project.path_with_namespace)
+            stats.status = "skipped"
+            continue
+
+        if options.incremental and manifest.is_up_to_date(project, options.mode, _destination(project, options)):
+            logger.debug("Repo %s not changed since last dump, skipping", project.path_with_namespace)
+            stats.status = "unchanged"
+            continue
+
+        pending.append((project, stats))
+
+    if pools is not None:
+        pools.seal()
+
+    if options.order == "size":
+        pending.sort(key=lambda item: project_size(item[0]), reverse=True)
+
+    return pending
+
+
+def dump_projects(gl: Gitlab, projects: Iterable[ProjectRecord], options: DumpOptions, report: RunReport) -> RunReport:
+    """
+    Dump projects by pool of workers. Per-project results and errors are collected to report,
+    manifest is saved when all workers are done.
+
+    Manifest and journal of completed projects are checkpointed while running, so interrupted dump
+    can be continued with 'resume' option without refetching listing and redumping completed projects.
+
+    With 'size' order the largest repos are submitted first: idle worker always takes the biggest
+    remaining repo (LPT scheduling), so the run doesn't end waiting for a single huge repo started last.
+    """
+    limits = TransportLimits.create(api=options.api_jobs or options.jobs, git=options.git_jobs or options.jobs)
+    manifest = DumpManifest(options.dumps_dir, part=options.manifest_part).load()
+    queue = ClaimQueue(options.queue_dir, options.run_id) if options.queue_dir else None
+    journal, done_ids = None, set()
+    if not options.dry_run:
+        journal, projects, done_ids = _open_journal(projects, options)
+        if queue is not None:
+            # projects claimed by the previous runs of journal, but not done, are dumped again
+            queue.adopt(journal.take_over(queue.worker))
+    pools = ObjectPools(options.dumps_dir) if options.object_pool and options.mode != "archive" else None
+
+    pending = _select_projects(projects, options, manifest, report, done_ids=done_ids, pools=pools)
+
+    with ThreadPoolExecutor(max_workers=options.jobs, thread_name_prefix="dump") as executor:
+        futures = {}
+        for project, stats in pending:
+            future = executor.submit(dump_project, gl, project, options, limits, manifest, stats, queue, pools)
+            futures[future] = stats
+
+        completed: list[int] = []
+        checkpoint_at = time.monotonic()
+        try:
+            for future in as_completed(futures):
+                stats = futures[future]
+                try:
+                    future.result()
+                    completed.append(stats.project_id)
+                except Exception as e:
+                    stats.status = "failed"
+                    stats.error = f"{e.__class__.__name__}: {str(e)}"
+
+                    logger.error(
+                        "Something went wrong while clone or pull repo %s",
+                        stats.path_with_namespace,
+                        exc_info=e,
+                        extra={"project_id": stats.project_id, "project": stats.path_with_namespace},
+                    )
+
+                if journal is not None and time.monotonic() - checkpoint_at >= CHECKPOINT_INTERVAL:
+                    manifest.save()
+                    journal.mark_done(completed)
+                    completed, checkpoint_at = [], time.monotonic()
+        except BaseException:
+            # on Ctrl-C don't wait for queued projects, only for the ones already running
+            executor.shutdown(wait=True, cancel_futures=True)
+            # projects finished while shutting down, ids already checkpointed are harmless duplicates in journal
+            completed.extend(
+                stats.project_id
+                for future, stats in futures.items()
+                if future.done() and not future.cancelled() and future.exception() is None
+            )
+            raise
+        finally:
+            # results since the last checkpoint are kept even if the run is interrupted
+            if journal is not None:
+                manifest.save()
+                journal.mark_done(completed)
+
+    if journal is not None:
+        journal.remove()
+
+    return report
+
+
+__all__ = ["DumpOptions", "dump_project", "dump_projects", "project_size"]
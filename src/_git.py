@@ -1,70 +1,470 @@
+import glob
+import hashlib
 import os
-from typing import Literal
+import shutil
+import threading
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import ContextManager, Iterator, Literal
+from urllib.parse import quote
 
+from src._archive_store import ArchiveStore
+from src._pool import ObjectPools, add_alternates
+from src._records import ProjectRecord
 from src._settings import get_logger
+from src._telemetry import ProjectStats, objects_size
 from src._utils import safe_resolve_path
 
 from git import Repo as GitRepository
 from git.exc import GitCommandError
 
-from gitlab.v4.objects import Project
+from gitlab import Gitlab
+from requests import Response
+from requests.exceptions import ChunkedEncodingError, ConnectionError as RequestsConnectionError
 
 logger = get_logger()
 
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+ARCHIVE_DOWNLOAD_ATTEMPTS = 3
 
-def clone_or_update_repo(project: Project, dumps_base_dir: str, dry_run: bool = False) -> None:
-    """Clone repo from remote origin or pull fresh changes if exists."""
+# marker file next to repo while git works on it, left behind only if dump was killed in the middle
+INCOMPLETE_MARKER_SUFFIX = ".incomplete"
+
+
+@dataclass
+class TransportLimits:
+    """Concurrency caps shared between dump workers."""
+
+    api: threading.BoundedSemaphore
+    git: threading.BoundedSemaphore
+
+    @classmethod
+    def create(cls, api: int, git: int) -> "TransportLimits":
+        return cls(api=threading.BoundedSemaphore(max(api, 1)), git=threading.BoundedSemaphore(max(git, 1)))
+
+
+@dataclass
+class CloneOptions:
+    """Shallow and partial clone parameters, also applied on updates of existing clones."""
+
+    depth: int | None = None
+    blob_filter: str | None = None  # e.g. blob:none
+    single_branch: bool = False
+
+    def clone_args(self) -> dict[str, int | str | bool]:
+        args = self.fetch_args()
+        if self.blob_filter:
+            args["filter"] = self.blob_filter
+        if self.single_branch:
+            args["single_branch"] = True
+        return args
+
+    def fetch_args(self) -> dict[str, int | str | bool]:
+        # filter and single branch refspec are saved to remote config by clone, only depth must be passed on fetch
+        return {"depth": self.depth} if self.depth else {}
+
+
+def _slot(limits: TransportLimits | None, kind: Literal["api", "git"]) -> ContextManager:
+    """Returns semaphore for transport kind or no-op context if limits not set."""
+    if limits is None:
+        return nullcontext()
+    return getattr(limits, kind)
+
+
+@contextmanager
+def _transfer(limits: TransportLimits | None, kind: Literal["api", "git"], stats: ProjectStats) -> Iterator[None]:
+    """Take transport slot, time of waiting for slot and of transfer itself are measured separately."""
+    slot = _slot(limits, kind)
+    with stats.measure("slot_wait"):
+        slot.__enter__()
+    try:
+        with stats.measure("transfer"):
+            yield
+    finally:
+        slot.__exit__(None, None, None)
+
+
+def get_repo_destination(project: ProjectRecord, dumps_base_dir: str, mirror: bool = False) -> str:
+    """Returns path where project repo is cloned, bare mirrors get .git suffix."""
+    destination_path = os.path.join(safe_resolve_path(dumps_base_dir), *project.path_with_namespace.split("/"))
+    return f"{destination_path}.git" if mirror else destination_path
+
+
+def get_archive_destination(project: ProjectRecord, dumps_base_dir: str, archive_format: str = "tar.gz") -> str:
+    """Returns path where project archive is saved, full namespace path keeps same-named repos of subgroups apart."""
+    destination_path = os.path.join(safe_resolve_path(dumps_base_dir), *project.path_with_namespace.split("/"))
+    return f"{destination_path}.{archive_format}"
+
+
+def get_head_sha(repo: GitRepository) -> str | None:
+    """Returns HEAD commit SHA or None for empty repo."""
+    try:
+        return repo.head.commit.hexsha
+    except ValueError:
+        return None
+
+
+def _reference_args(reference: str | None) -> dict[str, str]:
+    """Clone arguments to borrow objects from local pool, clone still works if pool is unusable."""
+    return {"reference_if_able": reference} if reference else {}
+
+
+@contextmanager
+def _incomplete_marker(destination_path: str, action: Literal["clone", "update"]) -> Iterator[None]:
+    marker_path = f"{destination_path}{INCOMPLETE_MARKER_SUFFIX}"
+    os.makedirs(os.path.dirname(marker_path), exist_ok=True)
+    with open(marker_path, "w") as fh:
+        fh.write(action)
+    try:
+        yield
+    finally:
+        os.remove(marker_path)
+
+
+def _recover_interrupted(destination_path: str, git_dir: str, project_slug: str) -> None:
+    """
+    Cleanup after dump killed while git was working on repo: half-written clone is removed,
+    stale lock files of interrupted update are dropped, so the next git command doesn't fail on them.
+    """
+    marker_path = f"{destination_path}{INCOMPLETE_MARKER_SUFFIX}"
+    if not os.path.exists(marker_path):
+        return
+
+    with open(marker_path, "r") as fh:
+        action = fh.read().strip()
+
+    if action == "clone":
+        logger.warning("Found incomplete clone of %s, removing it", project_slug)
+        shutil.rmtree(destination_path, ignore_errors=True)
+    else:
+        logger.warning("Found interrupted update of %s, removing stale git locks", project_slug)
+        for lock_path in glob.glob(os.path.join(git_dir, "**", "*.lock"), recursive=True):
+            os.remove(lock_path)
+
+    os.remove(marker_path)
+
+
+def _object_pool_reference(
+    project: ProjectRecord, git_objects_dir: str, pools: ObjectPools | None, limits, stats: ProjectStats
+) -> str | None:
+    """Update object pool of project fork network, existing repo gets the pool as alternates."""
+    if pools is None:
+        return None
+
+    with _transfer(limits, "git", stats):
+        reference = pools.reference_for(project, stats)
+
+    if reference is not None and os.path.isdir(git_objects_dir) and add_alternates(git_objects_dir, reference):
+        logger.info("Object pool %s attached to %s", reference, project.path_with_namespace)
+    return reference
+
+
+def _mirror_or_update_repo(
+    project: ProjectRecord,
+    destination_path: str,
+    limits: TransportLimits | None,
+    stats: ProjectStats,
+    pools: ObjectPools | None = None,
+) -> str | None:
+    """Keep bare mirror of repo, existing mirror is updated by single fetch without checkout."""
     project_slug = project.path_with_namespace
-    destination_path = os.path.join(safe_resolve_path(dumps_base_dir), *project_slug.split("/"))
+
+    _recover_interrupted(destination_path, destination_path, project_slug)
+    reference = _object_pool_reference(project, os.path.join(destination_path, "objects"), pools, limits, stats)
+
+    if os.path.isdir(destination_path):
+        logger.info("Fetching %s to existing mirror...", project_slug)
+        repo = GitRepository(destination_path)
+        size_before = objects_size(repo)
+        with _transfer(limits, "git", stats), _incomplete_marker(destination_path, "update"):
+            repo.git.fetch("--prune", "origin")
+        stats.bytes += max(objects_size(repo) - size_before, 0)
+        logger.info("Mirror of %s successfully updated", project_slug)
+    else:
+        logger.info("Mirroring %s...", project_slug)
+        with _transfer(limits, "git", stats), _incomplete_marker(destination_path, "clone"):
+            repo = GitRepository.clone_from(
+                project.ssh_url_to_repo, to_path=destination_path, mirror=True, **_reference_args(reference)
+            )
+        stats.bytes += objects_size(repo)
+        logger.info("Project %s successfully mirrored", project_slug)
+
+    return get_head_sha(repo)
+
+
+def clone_or_update_repo(
+    project: ProjectRecord,
+    dumps_base_dir: str,
+    dry_run: bool = False,
+    limits: TransportLimits | None = None,
+    mirror: bool = False,
+    stats: ProjectStats | None = None,
+    clone_options: CloneOptions | None = None,
+    pools: ObjectPools | None = None,
+) -> str | None:
+    """
+    Clone repo from remote origin or pull fresh changes if exists. Returns HEAD SHA.
+    Transfer time and size of fetched objects are added to stats.
+    With object pools forks share objects of their upstream through git alternates.
+    """
+    stats = stats or ProjectStats()
+    clone_options = clone_options or CloneOptions()
+    project_slug = project.path_with_namespace
+    destination_path = get_repo_destination(project, dumps_base_dir, mirror=mirror)
 
     if dry_run:
-        logger.info(f"Simulate clonning {project_slug} to {destination_path}")
-        return
+        logger.info("Simulate %s %s to %s", "mirroring" if mirror else "clonning", project_slug, destination_path)
+        return None
+
+    if mirror:
+        return _mirror_or_update_repo(project, destination_path, limits, stats, pools=pools)
+
+    git_dir = os.path.join(destination_path, ".git")
+    _recover_interrupted(destination_path, git_dir, project_slug)
+    reference = _object_pool_reference(project, os.path.join(git_dir, "objects"), pools, limits, stats)
+
+    if not os.path.exists(destination_path):
+        logger.info("Clonning %s...", project.path_with_namespace)
+        with _transfer(limits, "git", stats), _incomplete_marker(destination_path, "clone"):
+            repo = GitRepository.clone_from(
+                project.ssh_url_to_repo,
+                to_path=destination_path,
+                **clone_options.clone_args(),
+                **_reference_args(reference),
+            )
+        stats.bytes += objects_size(repo)
+        logger.info("Project %s successfully cloned", project_slug)
+        return get_head_sha(repo)
 
+    logger.warning("Repo %s already cloned, trying to pulling changes...", project_slug)
+    existed_repo = GitRepository(destination_path)
+
+    if existed_repo.is_dirty():
+        raise RuntimeError(f"Can't pull repo {project_slug}, cause we have unsaved changes. Resolve it manually")
+
+    size_before = objects_size(existed_repo)
     try:
-        logger.info(f"Clonning {project.path_with_namespace}...")
-        GitRepository.clone_from(project.ssh_url_to_repo, to_path=destination_path)
-        logger.info(f"Project {project_slug} successfully cloned")
-    except GitCommandError:
-        logger.warning("Repo already cloned, trying to pulling changes...")
-        existed_repo = GitRepository(destination_path)
+        with _transfer(limits, "git", stats), _incomplete_marker(destination_path, "update"):
+            if clone_options.depth:
+                # shallow histories can't be merged, so snapshot is moved to the fetched upstream tip
+                existed_repo.remotes.origin.fetch(**clone_options.fetch_args())
+                existed_repo.git.reset("--hard", "@{upstream}")
+            else:
+                existed_repo.remotes.origin.pull()
+        stats.bytes += max(objects_size(existed_repo) - size_before, 0)
+        logger.info("Successfully pulled %s from remote origin", project_slug)
+    except (GitCommandError, ValueError):
+        logger.error("Possible empty repo or head, skipping pull for %s", project_slug)
+
+    return get_head_sha(existed_repo)
+
+
+def _file_sha256(path: str) -> "hashlib._Hash":
+    """Returns SHA256 hash object fed with file content, reads file by chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(ARCHIVE_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest
 
-        if existed_repo.is_dirty():
-            logger.error(f"Can't pull repo {project_slug}, cause we have unsaved changes. Please resolve it manually")
-            return
+
+def _open_archive_stream(
+    gl: Gitlab,
+    project: ProjectRecord,
+    archive_format: str,
+    offset: int = 0,
+    etag: str | None = None,
+    sha: str | None = None,
+) -> Response:
+    """
+    Request archive as stream, asks server to continue from offset if partial download exists.
+    Status of range request isn't checked here, caller falls back to full download if it can't be continued.
+    """
+    path = f"/projects/{project.id}/repository/archive.{archive_format}"
+    query = {"sha": sha} if sha else {}
+
+    if not offset or etag is None:
+        return gl.http_request("get", path, query_data=query, streamed=True)
+
+    # python-gitlab doesn't allow custom headers per request, so range request goes through the session directly
+    opts = gl._get_session_opts()
+    headers = opts.pop("headers")
+    headers.update({"Range": f"bytes={offset}-", "If-Range": etag})
+    return gl.session.get(gl._build_url(path), params=query, headers=headers, stream=True, **opts)
+
+
+def _continues_download(response: Response, offset: int) -> bool:
+    """Range response is usable: full content (200) or the rest of content starting exactly at offset (206)."""
+    if response.status_code == 200:
+        return True
+    return response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+
+
+def _download_archive(
+    gl: Gitlab,
+    project: ProjectRecord,
+    archive_name: str,
+    archive_format: str,
+    stats: ProjectStats,
+    sha: str | None = None,
+) -> str:
+    """
+    Stream archive to temporary file by chunks and atomically move it to archive_name.
+    Partial download is resumed if server supports range requests. Returns SHA256 of archive.
+    """
+    project_slug = project.path_with_namespace
+    part_name = f"{archive_name}.part"
+    etag_name = f"{part_name}.etag"
+
+    for attempt in range(1, ARCHIVE_DOWNLOAD_ATTEMPTS + 1):
+        etag = None
+        if os.path.exists(part_name) and os.path.exists(etag_name):
+            with open(etag_name, "r") as fh:
+                etag = fh.read().strip() or None
+        offset = os.path.getsize(part_name) if etag is not None else 0
 
         try:
-            existed_repo.remotes.origin.pull()
-            logger.info(f"Successfully pulled {project_slug} from remote origin")
-        except (GitCommandError, ValueError):
-            logger.error(f"Possible empty repo or head, skipping pull for {project_slug}")
+            response = _open_archive_stream(gl, project, archive_format, offset=offset, etag=etag, sha=sha)
+            if offset and not _continues_download(response, offset):
+                # e.g. 416 when .part is already complete, partial download is useless
+                logger.warning(
+                    "Can't resume download of %s from %d bytes (HTTP %d), starting over",
+                    project_slug,
+                    offset,
+                    response.status_code,
+                )
+                response.close()
+                for stale_path in (part_name, etag_name):
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+                offset = 0
+                response = _open_archive_stream(gl, project, archive_format, sha=sha)
+
+            resumed = offset > 0 and response.status_code == 206
+            if resumed:
+                logger.info("Resuming download of %s from %d bytes", project_slug, offset)
+                digest = _file_sha256(part_name)
+            else:
+                digest = hashlib.sha256()
+
+            if response.headers.get("ETag"):
+                with open(etag_name, "w") as fh:
+                    fh.write(response.headers["ETag"])
+
+            with open(part_name, "ab" if resumed else "wb") as archive:
+                for chunk in response.iter_content(chunk_size=ARCHIVE_CHUNK_SIZE):
+                    if chunk:
+                        archive.write(chunk)
+                        digest.update(chunk)
+                        stats.bytes += len(chunk)
+                archive.flush()
+                os.fsync(archive.fileno())
+            break
+        except (ChunkedEncodingError, RequestsConnectionError) as e:
+            if attempt == ARCHIVE_DOWNLOAD_ATTEMPTS:
+                raise
+            stats.retries += 1
+            logger.warning("Download of %s interrupted (%s), retrying...", project_slug, e.__class__.__name__)
+
+    os.replace(part_name, archive_name)
+    if os.path.exists(etag_name):
+        os.remove(etag_name)
+
+    return digest.hexdigest()
 
 
 def save_repo_as_archive(
-    project: Project,
+    gl: Gitlab,
+    project: ProjectRecord,
     dumps_base_dir: str,
     dry_run: bool = False,
     archive_format: Literal["zip", "tar", "tar.gz"] = "tar.gz",
-) -> None:
-    """Download archived repo."""
+    limits: TransportLimits | None = None,
+    stats: ProjectStats | None = None,
+) -> str | None:
+    """Download archived repo. Returns archive SHA256 checksum, transfer time and bytes are added to stats."""
+    stats = stats or ProjectStats()
     project_slug = project.path_with_namespace
     if project.empty_repo:
-        logger.warning(f"Project {project_slug} is empty and can't be download")
-        return
+        logger.warning("Project %s is empty and can't be download", project_slug)
+        return None
 
-    breadcrumbs = project_slug.split("/")
-    destination_path = os.path.join(safe_resolve_path(dumps_base_dir), *breadcrumbs[:1])
-    archive_name = os.path.join(destination_path, f"{breadcrumbs[-1]}.{archive_format}")
+    archive_name = get_archive_destination(project, dumps_base_dir, archive_format)
+    destination_path = os.path.dirname(archive_name)
 
     if dry_run:
-        logger.info(f"Simulate downloading {archive_name} to {destination_path}")
-        return
+        logger.info("Simulate downloading %s to %s", archive_name, destination_path)
+        return None
 
     os.makedirs(destination_path, exist_ok=True)
-    with open(archive_name, "wb") as archive:
-        logger.info(f"Downloading {project_slug} to {destination_path}")
-        archive.write(project.repository_archive(format=archive_format))
-        logger.info(f"Project {project_slug} successfully saved as {archive_name}")
+    logger.info("Downloading %s to %s", project_slug, destination_path)
+    with _transfer(limits, "api", stats):
+        checksum = _download_archive(gl, project, archive_name, archive_format, stats)
+    logger.info("Project %s successfully saved as %s", project_slug, archive_name)
+
+    return checksum
+
+
+def get_default_branch_sha(gl: Gitlab, project: ProjectRecord) -> str:
+    """Returns SHA of the last commit in project default branch."""
+    branch = gl.http_get(f"/projects/{project.id}/repository/branches/{quote(project.default_branch, safe='')}")
+    return branch["commit"]["id"]
+
+
+def save_repo_to_archive_store(
+    gl: Gitlab,
+    project: ProjectRecord,
+    dumps_base_dir: str,
+    store: ArchiveStore,
+    dry_run: bool = False,
+    archive_format: Literal["zip", "tar", "tar.gz"] = "tar.gz",
+    limits: TransportLimits | None = None,
+    stats: ProjectStats | None = None,
+) -> tuple[str, str] | None:
+    """
+    Download archive of default branch to the content-addressed store, download is skipped
+    if archive of the same commit is already stored. Returns commit SHA and archive SHA256.
+    """
+    stats = stats or ProjectStats()
+    project_slug = project.path_with_namespace
+    if project.empty_repo or not project.default_branch:
+        logger.warning("Project %s is empty and can't be download", project_slug)
+        return None
+
+    with _transfer(limits, "api", stats):
+        sha = get_default_branch_sha(gl, project)
+
+    archive_name = get_archive_destination(project, dumps_base_dir, archive_format)
+    object_path = store.object_path(project.id, sha, archive_format)
+
+    if dry_run:
+        logger.info("Simulate downloading %s@%.12s to %s", project_slug, sha, object_path)
+        return None
+
+    checksum = store.load_index(project.id).objects.get(sha)
+    if checksum is not None and os.path.exists(object_path):
+        logger.info("Archive of %s@%.12s already stored, skipping download", project_slug, sha)
+        stats.status = "unchanged"
+    else:
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        logger.info("Downloading %s@%.12s to %s", project_slug, sha, object_path)
+        with _transfer(limits, "api", stats):
+            checksum = _download_archive(gl, project, object_path, archive_format, stats, sha=sha)
+
+    store.add_snapshot(project.id, sha, checksum, archive_format)
+    store.publish(project.id, sha, archive_name, archive_format)
+    logger.info("Project %s successfully saved as %s", project_slug, archive_name)
+
+    return sha, checksum
 
 
-__all__ = ["clone_or_update_repo", "save_repo_as_archive"]
+__all__ = [
+    "CloneOptions",
+    "clone_or_update_repo",
+    "save_repo_as_archive",
+    "save_repo_to_archive_store",
+    "get_default_branch_sha",
+    "get_repo_destination",
+    "get_archive_destination",
+    "TransportLimits",
+]
@@ -1,12 +1,37 @@
-from src._settings import Settings, get_logger
-from functools import cached_property
-from typing import Iterator
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from src._settings import Settings, get_logger, get_settings
+from src._cache import MetadataCache, get_metadata_cache
+from src._ratelimit import AdaptiveRateLimiter, RateLimitedSession
+from src._records import GroupRecord, ProjectRecord
+from src._utils import parse_datetime
+from functools import cached_property, lru_cache
+from itertools import chain
+from typing import Any, Iterable, Iterator
 
 from gitlab import Gitlab
-from gitlab.v4.objects import Group, GroupSubgroup, Project
+from requests import Session
+from requests.adapters import HTTPAdapter
+from gitlab.exceptions import GitlabGetError
 
 logger = get_logger()
 
+# Gitlab updates project last_activity_at not more often than once per hour,
+# so delta listing looks back a bit further than the last sync
+LAST_ACTIVITY_GRANULARITY = 3600
+
+# how many pages are requested per concurrent batch, relative to concurrency limit
+PAGES_WINDOW_FACTOR = 4
+
+
+def _query_value(value: Any) -> Any:
+    """Gitlab expects lowercase booleans in query string."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
 
 class GitlabClientWrapper:
     """A simple wrapper with additional methods over the Gitlab client."""
@@ -16,16 +41,54 @@ class GitlabClientWrapper:
         endpoint: str,
         oauth_token: str | None = None,
         personal_token: str | None = None,
+        cache: MetadataCache | None = None,
+        concurrency: int = 4,
+        per_page: int = 100,
+        limiter: AdaptiveRateLimiter | None = None,
+        pool_size: int = 16,
+        timeout: tuple[float, float] | None = (10.0, 60.0),
+        keep_alive: bool = True,
+        gzip: bool = True,
     ) -> None:
         self.endpoint = endpoint
         self.oauth_token = oauth_token
         self.personal_token = personal_token
+        self.cache = cache
+        self.concurrency = max(concurrency, 1)
+        self.per_page = per_page
+        self.limiter = limiter or AdaptiveRateLimiter()
+        self.pool_size = max(pool_size, self.concurrency)
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.gzip = gzip
 
     @cached_property
     def client(self) -> Gitlab:
         """Returns Gitlab client object."""
         auth = self._validate()
-        return Gitlab(url=self.endpoint, retry_transient_errors=True, **auth)
+        session = RateLimitedSession(self.limiter)
+        self._configure_session(session)
+        return Gitlab(url=self.endpoint, retry_transient_errors=True, session=session, timeout=self.timeout, **auth)
+
+    def _configure_session(self, session: Session) -> None:
+        """
+        Mount connection pool big enough for all parallel requests, so listings and downloads reuse
+        warm connections instead of opening new TLS sessions when the default pool (10) overflows.
+        """
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Accept-Encoding"] = "gzip, deflate" if self.gzip else "identity"
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+
+    def resize_pool(self, size: int) -> None:
+        """Grow connection pool, e.g. for parallel archive downloads."""
+        if size <= self.pool_size:
+            return
+        self.pool_size = size
+        if "client" in self.__dict__:
+            self._configure_session(self.client.session)
 
     def _validate(self) -> dict[str, str]:
         """Validate Gitlab authentification."""
@@ -42,12 +105,162 @@ class GitlabClientWrapper:
             auth = {"oauth_token": self.oauth_token}
         return auth
 
+    def _get_page(self, path: str, page: int, query: dict[str, Any]) -> tuple[list[dict[str, Any]], dict[str, str]]:
+        """Fetch single page of listing, returns items and response headers."""
+        response = self.client.http_request("get", path, query_data={**query, "page": page, "per_page": self.per_page})
+        return response.json(), response.headers
+
+    async def _fetch_pages(self, path: str, pages: Iterable[int], query: dict[str, Any]) -> list[list[dict[str, Any]]]:
+        """Fetch pages concurrently, not more than concurrency limit at once. Pages are returned in order."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(page: int) -> list[dict[str, Any]]:
+            async with semaphore:
+                items, _ = await asyncio.to_thread(self._get_page, path, page, query)
+                return items
+
+        return await asyncio.gather(*(fetch(page) for page in pages))
+
+    def paginate(self, path: str, **query: Any) -> Iterator[dict[str, Any]]:
+        """
+        Iterate over all items of API listing.
+        Total pages are known from X-Total-Pages of the first page, the rest are fetched concurrently
+        by windows, so latency is bounded by the slowest page of window and memory by the window size.
+        """
+        query = {key: _query_value(value) for key, value in query.items() if value is not None}
+        items, headers = self._get_page(path, 1, query)
+        yield from items
+
+        total_pages = int(headers.get("X-Total-Pages") or 0)
+        if not total_pages:
+            # Gitlab omits totals for very large collections, fallback to sequential pagination
+            next_page = headers.get("X-Next-Page")
+            while next_page:
+                items, headers = self._get_page(path, int(next_page), query)
+                yield from items
+                next_page = headers.get("X-Next-Page")
+            return
+
+        window = self.concurrency * PAGES_WINDOW_FACTOR
+        for first_page in range(2, total_pages + 1, window):
+            pages = range(first_page, min(first_page + window, total_pages + 1))
+            yield from chain.from_iterable(asyncio.run(self._fetch_pages(path, pages, query)))
+
+    async def _fetch_subgroups(self, groups: list[GroupRecord]) -> list[tuple[GroupRecord, list[GroupRecord]]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(group: GroupRecord) -> tuple[GroupRecord, list[GroupRecord]]:
+            async with semaphore:
+                subgroups = await asyncio.to_thread(lambda: list(self.paginate(f"/groups/{group.id}/subgroups")))
+                return group, [GroupRecord.from_attrs(attrs) for attrs in subgroups]
+
+        return await asyncio.gather(*(fetch(group) for group in groups))
+
+    def fetch_subgroups(self, groups: Iterable[GroupRecord]) -> Iterator[tuple[GroupRecord, list[GroupRecord]]]:
+        """Find direct subgroups for each group, lookups run concurrently. Returns pairs in groups order."""
+        window = self.concurrency * PAGES_WINDOW_FACTOR
+        batch: list[GroupRecord] = []
+
+        for group in groups:
+            batch.append(group)
+            if len(batch) >= window:
+                yield from asyncio.run(self._fetch_subgroups(batch))
+                batch = []
+
+        if batch:
+            yield from asyncio.run(self._fetch_subgroups(batch))
+
+    def _list_groups(self, refresh: bool = False) -> Iterator[GroupRecord]:
+        """List all groups, from cache if it's fresh."""
+        groups = map(GroupRecord.from_attrs, self.paginate("/groups"))
+        if self.cache is None:
+            return groups
+
+        if refresh or not self.cache.is_fresh("groups"):
+            logger.info("Refreshing groups cache...")
+            started_at = time.time()
+            self.cache.store("groups", (group.to_dict() for group in groups), started_at=started_at, full=True)
+
+        return (GroupRecord(**data) for data in self.cache.load("groups"))
+
+    def _list_projects(self, refresh: bool = False) -> Iterator[ProjectRecord]:
+        """
+        List all projects from cache, cache must be enabled.
+        Stale cache is updated by projects with recent activity only, full rescan runs once per full scan TTL.
+        """
+        if refresh or self.cache.needs_full_scan("projects"):
+            logger.info("Refreshing projects cache, full scan...")
+            started_at = time.time()
+            projects = map(ProjectRecord.from_attrs, self.paginate("/projects", statistics=True))
+            self.cache.store("projects", (project.to_dict() for project in projects), started_at=started_at, full=True)
+        elif not self.cache.is_fresh("projects"):
+            since = datetime.fromtimestamp(self.cache.synced_at("projects") - LAST_ACTIVITY_GRANULARITY, timezone.utc)
+            logger.info("Refreshing projects cache, fetching projects with activity after %s...", since.isoformat())
+            started_at = time.time()
+            projects = map(
+                ProjectRecord.from_attrs,
+                self.paginate("/projects", statistics=True, last_activity_after=since.isoformat()),
+            )
+            self.cache.store(
+                "projects", (project.to_dict() for project in projects), started_at=started_at, full=False
+            )
+
+        return (ProjectRecord(**data) for data in self.cache.load("projects"))
+
+    def _list_namespace_projects(self, namespace: str, **filters) -> Iterator[ProjectRecord]:
+        """List projects of group (with subgroups) or user namespace, filtered on server side."""
+        try:
+            group = self.client.groups.get(namespace)
+            path = f"/groups/{group.id}/projects"
+            filters["include_subgroups"] = True
+        except GitlabGetError:
+            users = self.client.users.list(username=namespace)
+            if not users:
+                logger.warning("Namespace %s not found", namespace)
+                return
+            path = f"/users/{users[0].id}/projects"
+
+        yield from map(ProjectRecord.from_attrs, self.paginate(path, **filters))
+
+    def _list_projects_server_side(self, namespaces: list[str] | None = None, **filters) -> Iterator[ProjectRecord]:
+        """List projects with filters applied by Gitlab API."""
+        if namespaces is None:
+            yield from map(ProjectRecord.from_attrs, self.paginate("/projects", **filters))
+            return
+
+        seen: set[int] = set()
+        for namespace in namespaces:
+            for project in self._list_namespace_projects(namespace, **filters):
+                if project.id not in seen:
+                    seen.add(project.id)
+                    yield project
+
     def fetch_available_groups(
-        self, only_parent_groups: bool = False, exclude: list[str] | None = None
-    ) -> Iterator[Group]:
-        """Find available groups and returns iterator of Group objects."""
-        logger.info(f"Starting search groups with params: {only_parent_groups=} {exclude=}")
-        groups: Iterator[Group] = self.client.groups.list(all=True, iterator=True)
+        self,
+        only_parent_groups: bool = False,
+        exclude: list[str] | None = None,
+        refresh: bool = False,
+        namespaces: list[str] | None = None,
+    ) -> Iterator[GroupRecord]:
+        """
+        Find available groups and returns iterator of group records.
+        Namespaces are full paths of groups, their subgroups included.
+        """
+        logger.info(
+            "Starting search groups with params: only_parent_groups=%r exclude=%r namespaces=%r",
+            only_parent_groups,
+            exclude,
+            namespaces,
+        )
+        groups: Iterator[GroupRecord] = self._list_groups(refresh=refresh)
+
+        if namespaces is not None:
+            groups = filter(
+                lambda group: any(
+                    group.full_path.lower() == ns or group.full_path.lower().startswith(f"{ns}/") for ns in namespaces
+                ),
+                groups,
+            )
 
         if exclude is None and not only_parent_groups:
             return groups
@@ -66,16 +279,65 @@ class GitlabClientWrapper:
         namespaces: list[str] | None = None,
         statistics: bool = False,
         no_personal: bool = False,
-    ) -> Iterator[Project]:
-        """Find available projects and returns iterator of Project objects."""
-        logger.info(f"Starting search projects with params: {namespaces=} {exclude=} {no_personal=}")
-        projects = self.client.projects.list(all=True, iterator=True, statistics=statistics)
+        refresh: bool = False,
+        archived: bool | None = None,
+        min_access_level: int | None = None,
+        last_activity_after: datetime | None = None,
+        simple: bool = False,
+    ) -> Iterator[ProjectRecord]:
+        """
+        Find available projects and returns iterator of project records.
+        Namespaces are full paths of groups (subgroups included) or usernames.
+        Warm cache is filtered locally, otherwise filters are passed to Gitlab API,
+        so pages and payload scale with selection instead of instance size.
+        """
+        logger.info(
+            "Starting search projects with params: namespaces=%r exclude=%r no_personal=%r",
+            namespaces,
+            exclude,
+            no_personal,
+        )
+        use_cache = (
+            self.cache is not None
+            and min_access_level is None  # access level is not a part of project listing, can't filter locally
+            and not (namespaces and (refresh or self.cache.needs_full_scan("projects")))
+        )
 
-        if no_personal:
-            projects = filter(lambda project: project.namespace.get("kind") != "user", projects)
+        if use_cache:
+            projects = self._list_projects(refresh=refresh)
 
-        if namespaces is not None:
-            projects = filter(lambda project: project.namespace.get("path") in namespaces, projects)
+            if archived is not None:
+                projects = filter(lambda project: project.archived == archived, projects)
+
+            if last_activity_after is not None:
+                projects = filter(
+                    lambda project: parse_datetime(project.last_activity_at) > last_activity_after, projects
+                )
+
+            if namespaces is not None:
+                projects = filter(
+                    lambda project: any(
+                        project.namespace_full_path.lower() == ns
+                        or project.namespace_full_path.lower().startswith(f"{ns}/")
+                        for ns in namespaces
+                    ),
+                    projects,
+                )
+        else:
+            filters = {"statistics": statistics}
+            if archived is not None:
+                filters["archived"] = archived
+            if min_access_level is not None:
+                filters["min_access_level"] = min_access_level
+            if last_activity_after is not None:
+                filters["last_activity_after"] = last_activity_after.isoformat()
+            if simple and not statistics:
+                filters["simple"] = True
+
+            projects = self._list_projects_server_side(namespaces=namespaces, **filters)
+
+        if no_personal:
+            projects = filter(lambda project: project.namespace_kind != "user", projects)
 
         if exclude is not None:
             projects = filter(lambda project: project.path not in exclude, projects)
@@ -84,11 +346,32 @@ class GitlabClientWrapper:
 
 
 def get_gitlab_client(settings: Settings) -> GitlabClientWrapper:
+    cache = get_metadata_cache(
+        path=settings.CACHE_PATH or os.path.join(settings.DEFAULT_DUMP_DIR, ".metadata.sqlite"),
+        endpoint=settings.GITLAB_URL,
+        ttl=settings.CACHE_TTL,
+        full_scan_ttl=settings.CACHE_FULL_SCAN_TTL,
+        token=settings.GITLAB_PERSONAL_TOKEN or settings.GITLAB_OAUTH_TOKEN,
+    )
     return GitlabClientWrapper(
         endpoint=settings.GITLAB_URL,
         oauth_token=settings.GITLAB_OAUTH_TOKEN,
         personal_token=settings.GITLAB_PERSONAL_TOKEN,
+        cache=cache,
+        concurrency=settings.API_CONCURRENCY,
+        per_page=settings.API_PER_PAGE,
+        limiter=AdaptiveRateLimiter(max_rate=settings.API_RATE_LIMIT, burst=settings.API_RATE_BURST),
+        pool_size=settings.API_POOL_SIZE,
+        timeout=(settings.API_CONNECT_TIMEOUT, settings.API_READ_TIMEOUT),
+        keep_alive=settings.API_KEEP_ALIVE,
+        gzip=settings.API_GZIP,
     )
 
 
-__all__ = ["get_gitlab_client", "GitlabClientWrapper"]
+@lru_cache
+def get_default_gitlab_client() -> GitlabClientWrapper:
+    """Returns client configured by settings, shared by CLI commands."""
+    return get_gitlab_client(get_settings())
+
+
+__all__ = ["get_gitlab_client", "get_default_gitlab_client", "GitlabClientWrapper"]
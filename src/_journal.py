@@ -0,0 +1,142 @@
+import fcntl
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+from src._records import ProjectRecord
+from src._settings import get_logger
+from src._utils import safe_resolve_path
+
+logger = get_logger()
+
+JOURNAL_DIRNAME = ".journal.d"
+
+
+class DumpJournal:
+    """
+    Checkpoints of running dump in <dumps>/.journal.d/<name>/: fetched listing and ids of completed projects.
+    Both files are append-only, so the journal survives a crash at any point.
+    Journal is removed when dump run finishes. Running dump holds lock of its journal,
+    so the lock is free only if the journal was left by a dead process.
+    """
+
+    def __init__(self, dumps_base_dir: str, name: str = "default") -> None:
+        self.path = os.path.join(safe_resolve_path(dumps_base_dir), JOURNAL_DIRNAME, name)
+        self.lock_path = f"{self.path}.lock"
+        self._lock_fd: int | None = None
+        self.meta_path = os.path.join(self.path, "meta.json")
+        self.listing_path = os.path.join(self.path, "listing.jsonl")
+        self.done_path = os.path.join(self.path, "done")
+
+    def _read_meta(self) -> dict:
+        try:
+            with open(self.meta_path, "r") as fh:
+                return json.load(fh)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, **meta) -> None:
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(meta, fh)
+        os.replace(tmp_path, self.meta_path)
+
+    @classmethod
+    def find_interrupted(cls, dumps_base_dir: str, prefix: str) -> "DumpJournal | None":
+        """Locked journal named <prefix><pid> left by a dead process, None if there is no such one."""
+        journals_dir = os.path.join(safe_resolve_path(dumps_base_dir), JOURNAL_DIRNAME)
+        try:
+            names = sorted(os.listdir(journals_dir))
+        except FileNotFoundError:
+            return None
+
+        for name in names:
+            if not name.startswith(prefix) or not name.removeprefix(prefix).isdigit():
+                continue
+            journal = cls(dumps_base_dir, name)
+            if journal.exists() and journal.lock():
+                return journal
+        return None
+
+    def lock(self) -> bool:
+        """Lock journal until it's removed or process exits, False if it's locked by another running dump."""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.lock_path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        self._lock_fd = fd
+        return True
+
+    def exists(self) -> bool:
+        return os.path.exists(self.meta_path)
+
+    @property
+    def mode(self) -> str | None:
+        return self._read_meta().get("mode")
+
+    @property
+    def listing_complete(self) -> bool:
+        return self._read_meta().get("listing_complete", False)
+
+    def start(self, mode: str) -> None:
+        """Begin new journal, checkpoints of previous run are dropped."""
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+        self._write_meta(mode=mode, started_at=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+
+    def take_over(self, worker: str) -> list[str]:
+        """Record worker which continues the journal, returns workers which ran it before."""
+        meta = self._read_meta()
+        workers = meta.get("workers", [])
+        self._write_meta(**{**meta, "workers": [*workers, worker]})
+        return workers
+
+    def reopen_listing(self) -> None:
+        """Listing of interrupted run is incomplete and will be fetched again, completed projects are kept."""
+        if os.path.exists(self.listing_path):
+            os.remove(self.listing_path)
+
+    def record_listing(self, projects: Iterable[ProjectRecord]) -> Iterator[ProjectRecord]:
+        """Pass projects through and save them to journal, listing is marked complete when exhausted."""
+        with open(self.listing_path, "a") as fh:
+            for project in projects:
+                fh.write(json.dumps(project.to_dict()) + "\n")
+                fh.flush()
+                yield project
+
+        self._write_meta(**{**self._read_meta(), "listing_complete": True})
+
+    def load_listing(self) -> Iterator[ProjectRecord]:
+        with open(self.listing_path, "r") as fh:
+            for line in fh:
+                if line.strip():
+                    yield ProjectRecord(**json.loads(line))
+
+    def done_ids(self) -> set[int]:
+        if not os.path.exists(self.done_path):
+            return set()
+        with open(self.done_path, "r") as fh:
+            return {int(line) for line in fh if line.strip().isdigit()}
+
+    def mark_done(self, project_ids: Iterable[int]) -> None:
+        """Checkpoint completed projects, must be called after their results are saved to manifest."""
+        with open(self.done_path, "a") as fh:
+            fh.writelines(f"{project_id}\n" for project_id in project_ids)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def remove(self) -> None:
+        shutil.rmtree(self.path, ignore_errors=True)
+        if self._lock_fd is not None:
+            os.remove(self.lock_path)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+
+__all__ = ["DumpJournal", "JOURNAL_DIRNAME"]
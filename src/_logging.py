@@ -0,0 +1,97 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Iterator, Literal
+
+LogFormat = Literal["text", "json"]
+
+TEXT_FORMAT = "%(asctime)s [%(levelname)s] [%(threadName)s] %(message)s"
+TEXT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# structured fields of records, set by log_context() or passed by extra={...}
+CONTEXT_FIELDS = ("project_id", "project", "phase", "duration")
+
+_context: contextvars.ContextVar[dict[str, Any]] = contextvars.ContextVar("log_context", default={})
+
+
+@contextmanager
+def log_context(**fields: Any) -> Iterator[None]:
+    """Attach fields to all records logged by current thread inside the block."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record, context fields are included when set."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        for name in CONTEXT_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                data[name] = round(value, 3) if name == "duration" else value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class ContextQueueHandler(QueueHandler):
+    """
+    Puts records to queue from the logging thread, formatting and writes are done by listener thread.
+    Only message args are merged here, so objects passed as args can't change before the record is written.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        for name, value in _context.get().items():
+            if getattr(record, name, None) is None:
+                setattr(record, name, value)
+        return record
+
+
+def setup_queue_logging(level: str, log_format: LogFormat = "text") -> QueueListener | None:
+    """
+    Route records of all loggers through in-memory queue to a single stderr writer thread,
+    so dump workers don't block on stderr and lines of parallel workers never interleave.
+    Does nothing if root logger is already configured, like logging.basicConfig.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return None
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonLinesFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=TEXT_DATE_FORMAT))
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root.addHandler(ContextQueueHandler(log_queue))
+    root.setLevel(level)
+
+    listener = QueueListener(log_queue, stream_handler)
+    listener.start()
+    # records left in queue are written on exit
+    atexit.register(listener.stop)
+    return listener
+
+
+__all__ = ["JsonLinesFormatter", "LogFormat", "log_context", "setup_queue_logging"]
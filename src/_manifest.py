@@ -0,0 +1,203 @@
+import fcntl
+import json
+import os
+import threading
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from src._gitlab import LAST_ACTIVITY_GRANULARITY
+from src._records import ProjectRecord
+from src._settings import get_logger
+from src._utils import parse_datetime, safe_resolve_path
+
+logger = get_logger()
+
+DumpMode = Literal["clone", "mirror", "archive"]
+
+MANIFEST_FILENAME = ".manifest.json"
+MANIFEST_PARTS_DIRNAME = ".manifest.d"
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class ManifestEntry:
+    """State of the last successful dump of a single project."""
+
+    project_id: int
+    path_with_namespace: str
+    mode: DumpMode
+    path: str
+    last_activity_at: str | None = None
+    head_sha: str | None = None
+    archive_checksum: str | None = None
+    dumped_at: str | None = None
+    verified_at: str | None = None
+    verify_error: str | None = None  # None if the last verification passed
+
+
+class DumpManifest:
+    """
+    Persisted dump state stored as JSON in the dumps directory.
+    Sharded runs write own part to .manifest.d/<part>.json, parts are merged on load and by merge().
+    """
+
+    def __init__(self, dumps_base_dir: str, part: str | None = None) -> None:
+        base_dir = safe_resolve_path(dumps_base_dir)
+        self.path = os.path.join(base_dir, MANIFEST_FILENAME)
+        self.parts_dir = os.path.join(base_dir, MANIFEST_PARTS_DIRNAME)
+        self.part = part
+        self.entries: dict[int, ManifestEntry] = {}
+        self._own_ids: set[int] = set()  # entries which belong to this part
+        self._lock = threading.Lock()
+
+    @property
+    def save_path(self) -> str:
+        return os.path.join(self.parts_dir, f"{self.part}.json") if self.part else self.path
+
+    def _part_paths(self) -> list[str]:
+        if not os.path.isdir(self.parts_dir):
+            return []
+        return sorted(
+            os.path.join(self.parts_dir, name) for name in os.listdir(self.parts_dir) if name.endswith(".json")
+        )
+
+    def _read(self, path: str) -> list[ManifestEntry]:
+        try:
+            with open(path, "r") as fh:
+                data = json.load(fh)
+            return [ManifestEntry(**raw_entry) for raw_entry in data.get("projects", {}).values()]
+        except (ValueError, TypeError) as e:
+            logger.warning("Can't read dump manifest %s, ignoring it: %s", path, e)
+            return []
+
+    def load(self) -> "DumpManifest":
+        """Read manifest and its parts from disk, the latest dump of project wins."""
+        paths = [self.path] if os.path.exists(self.path) else []
+        paths.extend(self._part_paths())
+
+        for path in paths:
+            for entry in self._read(path):
+                current = self.entries.get(entry.project_id)
+                if current is None or (entry.dumped_at or "") >= (current.dumped_at or ""):
+                    self.entries[entry.project_id] = entry
+                if path == self.save_path:
+                    self._own_ids.add(entry.project_id)
+
+        return self
+
+    def _write(self, path: str, entries: dict[int, ManifestEntry]) -> None:
+        """Atomically write entries to path."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "projects": {str(pid): asdict(entry) for pid, entry in sorted(entries.items())},
+        }
+
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(data, fh, indent=2)
+        os.replace(tmp_path, path)
+
+    def save(self) -> None:
+        """
+        Write manifest, sharded run writes only own entries to its part.
+        Part can be shared by several processes of the same host, so own entries are merged into it under lock.
+        """
+        with self._lock:
+            if self.part:
+                entries = {pid: self.entries[pid] for pid in self._own_ids if pid in self.entries}
+            else:
+                entries = dict(self.entries)
+
+        if not self.part:
+            self._write(self.save_path, entries)
+            return
+
+        os.makedirs(self.parts_dir, exist_ok=True)
+        with open(f"{self.save_path}.lock", "w") as lock_fh:
+            fcntl.flock(lock_fh, fcntl.LOCK_EX)
+            stored = self._read(self.save_path) if os.path.exists(self.save_path) else []
+            for entry in stored:
+                current = entries.get(entry.project_id)
+                if current is None or (entry.dumped_at or "") > (current.dumped_at or ""):
+                    entries[entry.project_id] = entry
+            self._write(self.save_path, entries)
+
+    def merge(self) -> int:
+        """Fold all parts into the main manifest and remove them. Returns number of merged parts."""
+        part_paths = self._part_paths()
+        self.entries.clear()
+        self.part = None
+        self.load()
+        self.save()
+
+        for path in part_paths:
+            os.remove(path)
+            if os.path.exists(f"{path}.lock"):
+                os.remove(f"{path}.lock")
+        return len(part_paths)
+
+    def get(self, project_id: int) -> ManifestEntry | None:
+        with self._lock:
+            return self.entries.get(project_id)
+
+    def record(
+        self,
+        project: ProjectRecord,
+        mode: DumpMode,
+        path: str,
+        head_sha: str | None = None,
+        archive_checksum: str | None = None,
+    ) -> ManifestEntry:
+        """Save successful dump result for project."""
+        entry = ManifestEntry(
+            project_id=project.id,
+            path_with_namespace=project.path_with_namespace,
+            mode=mode,
+            path=path,
+            last_activity_at=project.last_activity_at,
+            head_sha=head_sha,
+            archive_checksum=archive_checksum,
+            dumped_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        with self._lock:
+            self.entries[project.id] = entry
+            self._own_ids.add(project.id)
+        return entry
+
+    def record_verification(self, project_id: int, error: str | None = None) -> None:
+        """Save result of integrity check of dumped project."""
+        with self._lock:
+            entry = self.entries.get(project_id)
+            if entry is None:
+                return
+            entry.verified_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+            entry.verify_error = error
+            self._own_ids.add(project_id)
+
+    def is_up_to_date(self, project: ProjectRecord, mode: DumpMode, path: str | None = None) -> bool:
+        """
+        Check project has no activity since the last successful dump in the same mode and dump isn't broken.
+        Dump saved to another path than expected one (e.g. moved namespace) is outdated.
+        Pushes within granularity of last_activity_at after the dump don't change it,
+        so dump is trusted only if it was taken at least granularity after the last activity.
+        """
+        entry = self.get(project.id)
+        if entry is None or entry.mode != mode or entry.verify_error is not None:
+            return False
+
+        if path is not None and entry.path != path:
+            return False
+
+        if project.last_activity_at is None or entry.last_activity_at != project.last_activity_at:
+            return False
+
+        settled_at = parse_datetime(project.last_activity_at) + timedelta(seconds=LAST_ACTIVITY_GRANULARITY)
+        if entry.dumped_at is None or parse_datetime(entry.dumped_at) < settled_at:
+            return False
+
+        return os.path.exists(entry.path)
+
+
+__all__ = ["DumpManifest", "DumpMode", "ManifestEntry", "MANIFEST_FILENAME"]
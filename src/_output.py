@@ -0,0 +1,91 @@
+import csv
+import json
+import sys
+from typing import Any, Iterable, Literal, TextIO
+
+import click
+
+OutputFormat = Literal["table", "plain", "csv", "jsonl"]
+OUTPUT_FORMATS: tuple[str, ...] = OutputFormat.__args__
+STREAMING_FORMATS = ("plain", "csv", "jsonl")
+
+
+class RecordWriter:
+    """
+    Write records (dicts with the same fields) to stdout in chosen format.
+    Streaming formats write every record as it arrives, 'table' keeps rows to align columns by tabulate.
+    Headers are human-readable column titles of table, other formats use field names.
+    """
+
+    def __init__(
+        self,
+        fields: list[str],
+        fmt: OutputFormat = "table",
+        stream: TextIO | None = None,
+        headers: list[str] | None = None,
+    ) -> None:
+        self.fields = fields
+        self.headers = headers or fields
+        self.fmt = fmt
+        self.stream = stream or sys.stdout
+        self._rows: list[list[Any]] = []
+        self._csv = csv.writer(self.stream, lineterminator="\n") if fmt == "csv" else None
+        self._header_written = False
+
+    @property
+    def is_streaming(self) -> bool:
+        return self.fmt in STREAMING_FORMATS
+
+    def _write_header(self) -> None:
+        self._header_written = True
+        if self.fmt == "csv":
+            self._csv.writerow(self.fields)
+        elif self.fmt == "plain":
+            self.stream.write("\t".join(self.fields) + "\n")
+
+    def write(self, record: dict[str, Any]) -> None:
+        if not self._header_written:
+            self._write_header()
+
+        if self.fmt == "jsonl":
+            self.stream.write(json.dumps({field: record.get(field) for field in self.fields}) + "\n")
+        elif self.fmt == "csv":
+            self._csv.writerow([record.get(field) for field in self.fields])
+        elif self.fmt == "plain":
+            self.stream.write("\t".join(str(record.get(field, "")) for field in self.fields) + "\n")
+        else:
+            self._rows.append([record.get(field) for field in self.fields])
+
+    def write_all(self, records: Iterable[dict[str, Any]]) -> None:
+        for record in records:
+            self.write(record)
+
+    def close(self) -> None:
+        if self.fmt == "table":
+            from tabulate import tabulate
+
+            click.echo("")
+            click.echo(tabulate(self._rows, headers=self.headers))
+            self._rows.clear()
+        self.stream.flush()
+
+    def __enter__(self) -> "RecordWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+def format_option(default: str = "table", formats: tuple[str, ...] = OUTPUT_FORMATS):
+    """Click option --format shared by listing commands, commands with own human-readable view pass own formats."""
+    return click.option(
+        "--format",
+        "output_format",
+        type=click.Choice(formats),
+        default=default,
+        show_default=True,
+        help="Output format, plain, csv and jsonl are printed row by row as records arrive.",
+    )
+
+
+__all__ = ["OUTPUT_FORMATS", "OutputFormat", "RecordWriter", "STREAMING_FORMATS", "format_option"]
@@ -0,0 +1,136 @@
+import fcntl
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+from src._records import ProjectRecord
+from src._settings import get_logger
+from src._telemetry import ProjectStats, objects_size
+from src._utils import safe_resolve_path
+
+from git import Repo as GitRepository
+from git.exc import GitCommandError
+
+logger = get_logger()
+
+OBJECT_POOLS_DIRNAME = ".pools"
+POOL_REFSPECS = ("+refs/heads/*:refs/heads/*", "+refs/tags/*:refs/tags/*")
+
+
+class ObjectPools:
+    """
+    Shared bare repos with objects of fork networks: <dumps>/.pools/<root project id>.git.
+    Forks are grouped by forked_from_project up to the root project known from listing,
+    members of the same network are cloned with the pool as git alternates,
+    so objects of the upstream are transferred and stored once.
+    """
+
+    def __init__(self, dumps_base_dir: str) -> None:
+        self.path = os.path.join(safe_resolve_path(dumps_base_dir), OBJECT_POOLS_DIRNAME)
+        self._parents: dict[int, int] = {}
+        self._urls: dict[int, str] = {}
+        self._members: Counter = Counter()
+        self._updated: set[int] = set()
+        self._failed: set[int] = set()
+        self._locks: dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def add(self, project: ProjectRecord) -> None:
+        """Register listed project, must be called for all projects before dump starts."""
+        self._urls[project.id] = project.ssh_url_to_repo
+        if project.forked_from_id is not None:
+            self._parents[project.id] = project.forked_from_id
+
+    def seal(self) -> None:
+        """Count members of fork networks when listing is complete."""
+        self._members = Counter(self.root_of(project_id) for project_id in self._urls)
+
+    def root_of(self, project_id: int) -> int:
+        """The topmost known ancestor of fork, parents out of listing are skipped."""
+        seen = {project_id}
+        while self._parents.get(project_id) in self._urls and self._parents[project_id] not in seen:
+            project_id = self._parents[project_id]
+            seen.add(project_id)
+        return project_id
+
+    def pool_path(self, root_id: int) -> str:
+        return os.path.join(self.path, f"{root_id}.git")
+
+    @contextmanager
+    def _file_lock(self, root_id: int) -> Iterator[None]:
+        """Pool may be shared by dumps of other processes or hosts, they must not fetch into it concurrently."""
+        os.makedirs(self.path, exist_ok=True)
+        with open(f"{self.pool_path(root_id)}.lock", "a") as fh:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+    def _update(self, root_id: int, stats: ProjectStats) -> None:
+        pool_path = self.pool_path(root_id)
+
+        if not os.path.isdir(pool_path):
+            logger.info("Creating object pool %s...", pool_path)
+            pool = GitRepository.init(pool_path, bare=True)
+            pool.create_remote("origin", self._urls[root_id])
+            # objects of pool are used by clones of forks, pool must never drop them
+            with pool.config_writer() as config:
+                config.set_value("gc", "auto", 0)
+                config.set_value("gc", "pruneExpire", "never")
+        else:
+            pool = GitRepository(pool_path)
+
+        size_before = objects_size(pool)
+        pool.git.fetch("origin", *POOL_REFSPECS)
+        stats.bytes += max(objects_size(pool) - size_before, 0)
+
+    def reference_for(self, project: ProjectRecord, stats: ProjectStats) -> str | None:
+        """
+        Returns path of object pool for project, pool is fetched once per run by the first member.
+        None if project is not a part of fork network with 2+ listed projects or the pool can't be updated,
+        then the project is cloned without pool.
+        """
+        root_id = self.root_of(project.id)
+        if self._members[root_id] < 2:
+            return None
+
+        with self._lock:
+            lock = self._locks.setdefault(root_id, threading.Lock())
+
+        with lock:
+            if root_id not in self._updated and root_id not in self._failed:
+                try:
+                    with self._file_lock(root_id):
+                        self._update(root_id, stats)
+                    self._updated.add(root_id)
+                except (GitCommandError, OSError) as e:
+                    logger.warning("Can't update object pool %s: %s", self.pool_path(root_id), e)
+                    self._failed.add(root_id)
+
+        if root_id in self._failed:
+            return None
+        return self.pool_path(root_id)
+
+
+def add_alternates(git_objects_dir: str, pool_path: str) -> bool:
+    """Attach pool to existing repo as alternate object store. Returns True if it wasn't attached before."""
+    alternates_path = os.path.join(git_objects_dir, "info", "alternates")
+    pool_objects_dir = os.path.join(pool_path, "objects")
+
+    existing = []
+    if os.path.exists(alternates_path):
+        with open(alternates_path, "r") as fh:
+            existing = [line.strip() for line in fh if line.strip()]
+    if pool_objects_dir in existing:
+        return False
+
+    os.makedirs(os.path.dirname(alternates_path), exist_ok=True)
+    with open(alternates_path, "a") as fh:
+        fh.write(f"{pool_objects_dir}\n")
+    return True
+
+
+__all__ = ["ObjectPools", "add_alternates"]
@@ -0,0 +1,146 @@
+import threading
+import time
+
+import requests
+
+from src._settings import get_logger
+
+logger = get_logger()
+
+# when RateLimit-Remaining drops below this share of RateLimit-Limit, rate is spread over the reset window
+REMAINING_LOW_WATERMARK = 0.1
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket shared by all requests to Gitlab.
+    Without max_rate requests are not throttled until the server asks to slow down by 429
+    or low RateLimit-Remaining, then the bucket starts from the half of the observed request rate.
+    Rate grows additively while server is happy and is cut in half on 429,
+    Retry-After / RateLimit-Reset pause all requests until the server is ready again.
+    """
+
+    def __init__(self, max_rate: float | None = None, burst: int = 10, min_rate: float = 0.5) -> None:
+        self.burst = max(burst, 1)
+        self.min_rate = min_rate
+        self.max_rate: float | None = None
+        self.rate: float | None = None  # None while not throttled
+        self.increase_step = 0.1
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._window_started_at = time.monotonic()
+        self._window_requests = 0
+        self._observed_rate = 0.0
+        self._lock = threading.Lock()
+        if max_rate:
+            self.set_max_rate(max_rate)
+
+    def set_max_rate(self, max_rate: float | None) -> None:
+        """Set hand-tuned ceiling of rate, None or 0 leaves the rate to the server."""
+        with self._lock:
+            self.max_rate = max_rate or None
+            self.rate = self.max_rate
+            if self.max_rate is not None:
+                self.min_rate = min(self.min_rate, self.max_rate)
+                self.increase_step = max(self.max_rate / 50, 0.1)
+
+    def _refill(self, now: float) -> None:
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _count_request(self, now: float) -> None:
+        """Requests per second of the last full second, starting point when throttling begins."""
+        self._window_requests += 1
+        elapsed = now - self._window_started_at
+        if elapsed >= 1:
+            self._observed_rate = self._window_requests / elapsed
+            self._window_started_at, self._window_requests = now, 0
+
+    def _throttle(self, rate: float) -> None:
+        self.rate = max(self.min_rate, rate)
+        if self.max_rate is None:
+            self.increase_step = max(self.rate / 50, 0.1)
+
+    def acquire(self) -> None:
+        """Block until request is allowed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate is None or self._tokens >= 1:
+                    if self.rate is not None:
+                        self._tokens -= 1
+                    self._count_request(now)
+                    return
+                else:
+                    wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+    def _pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def observe(self, response: requests.Response) -> None:
+        """Adapt rate by response status and Gitlab rate limit headers."""
+        headers = response.headers
+
+        with self._lock:
+            if response.status_code == 429:
+                self._throttle((self.rate or self._observed_rate) / 2)
+                retry_after = headers.get("Retry-After")
+                reset_at = headers.get("RateLimit-Reset")
+
+                if retry_after and retry_after.isdigit():
+                    self._pause(int(retry_after))
+                elif reset_at and reset_at.isdigit():
+                    self._pause(max(int(reset_at) - time.time(), 0))
+
+                logger.warning("Gitlab rate limit exceeded, slowing down to %.2f req/s", self.rate)
+                return
+
+            remaining, limit, reset_at = (
+                headers.get("RateLimit-Remaining"),
+                headers.get("RateLimit-Limit"),
+                headers.get("RateLimit-Reset"),
+            )
+            if remaining and limit and reset_at and remaining.isdigit() and limit.isdigit() and reset_at.isdigit():
+                if int(remaining) < int(limit) * REMAINING_LOW_WATERMARK:
+                    # spread the rest of quota over time left till reset
+                    window = max(int(reset_at) - time.time(), 1)
+                    self._throttle(min(self.rate or float("inf"), int(remaining) / window))
+                    return
+
+            if self.rate is not None:
+                self.rate += self.increase_step
+                if self.max_rate is not None:
+                    self.rate = min(self.max_rate, self.rate)
+
+
+class RateLimitedSession(requests.Session):
+    """Requests session that passes every request through rate limiter."""
+
+    def __init__(self, limiter: AdaptiveRateLimiter) -> None:
+        super().__init__()
+        self.limiter = limiter
+        self.requests_total = 0
+        self.retries_total = 0  # responses which python-gitlab retries: 429 and 5xx
+        self._counters_lock = threading.Lock()
+
+    def request(self, *args, **kwargs) -> requests.Response:
+        self.limiter.acquire()
+        response = super().request(*args, **kwargs)
+        self.limiter.observe(response)
+
+        with self._counters_lock:
+            self.requests_total += 1
+            if response.status_code == 429 or response.status_code >= 500:
+                self.retries_total += 1
+        return response
+
+
+__all__ = ["AdaptiveRateLimiter", "RateLimitedSession"]
@@ -0,0 +1,80 @@
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(slots=True)
+class GroupRecord:
+    """Fields of Gitlab group used by commands, without payload and manager of python-gitlab object."""
+
+    id: int
+    path: str
+    full_path: str
+    parent_id: int | None = None
+    web_url: str = ""
+
+    @classmethod
+    def from_attrs(cls, attrs: dict[str, Any]) -> "GroupRecord":
+        """Build record from Gitlab API payload."""
+        return cls(
+            id=attrs["id"],
+            path=attrs["path"],
+            full_path=attrs["full_path"],
+            parent_id=attrs.get("parent_id"),
+            web_url=attrs.get("web_url", ""),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class ProjectRecord:
+    """
+    Fields of Gitlab project used by listing and dump, namespace and statistics are flattened.
+    Fields missing in payload of simple=True listing get defaults.
+    """
+
+    id: int
+    path: str
+    path_with_namespace: str
+    namespace_id: int | None = None
+    namespace_full_path: str = ""
+    namespace_kind: str | None = None
+    ssh_url_to_repo: str = ""
+    web_url: str = ""
+    default_branch: str | None = None
+    empty_repo: bool = False
+    archived: bool = False
+    last_activity_at: str | None = None
+    repository_size: int | None = None
+    forked_from_id: int | None = None
+
+    @classmethod
+    def from_attrs(cls, attrs: dict[str, Any]) -> "ProjectRecord":
+        """Build record from Gitlab API payload."""
+        namespace = attrs.get("namespace") or {}
+        statistics = attrs.get("statistics") or {}
+        forked_from = attrs.get("forked_from_project") or {}
+
+        return cls(
+            id=attrs["id"],
+            path=attrs["path"],
+            path_with_namespace=attrs["path_with_namespace"],
+            namespace_id=namespace.get("id"),
+            namespace_full_path=namespace.get("full_path", ""),
+            namespace_kind=namespace.get("kind"),
+            ssh_url_to_repo=attrs.get("ssh_url_to_repo", ""),
+            web_url=attrs.get("web_url", ""),
+            default_branch=attrs.get("default_branch"),
+            empty_repo=attrs.get("empty_repo", False),
+            archived=attrs.get("archived", False),
+            last_activity_at=attrs.get("last_activity_at"),
+            repository_size=statistics.get("repository_size"),
+            forked_from_id=forked_from.get("id"),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+__all__ = ["GroupRecord", "ProjectRecord"]
@@ -5,6 +5,8 @@ from typing import Literal
 from dotenv import load_dotenv, find_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from src._logging import LogFormat, setup_queue_logging
+
 
 class Settings(BaseSettings):
     """Gitlab dumper settings."""
@@ -14,7 +16,23 @@ class Settings(BaseSettings):
     GITLAB_PERSONAL_TOKEN: str | None = None
 
     DEFAULT_DUMP_DIR: str = "./dumps"
+
+    API_CONCURRENCY: int = 4  # max parallel API requests of listings
+    API_PER_PAGE: int = 100
+    API_RATE_LIMIT: float | None = None  # max requests per second, by default the rate is driven by Gitlab only
+    API_RATE_BURST: int = 10
+    API_POOL_SIZE: int = 16  # kept-alive connections to Gitlab, raised to the number of parallel requests
+    API_CONNECT_TIMEOUT: float = 10.0  # seconds
+    API_READ_TIMEOUT: float = 60.0  # seconds between bytes of response, not the whole download
+    API_KEEP_ALIVE: bool = True
+    API_GZIP: bool = True  # ask for compressed JSON responses
+
+    CACHE_PATH: str | None = None  # default: <DEFAULT_DUMP_DIR>/.metadata.sqlite
+    CACHE_TTL: int = 900  # seconds, 0 disables cache
+    CACHE_FULL_SCAN_TTL: int = 86400  # seconds between full rescans, deltas are fetched in between
+
     LOG_LEVEL: Literal["debug", "info", "warning", "error"] = "info"
+    LOG_FORMAT: LogFormat = "text"  # json: one object per line with project_id, phase and duration fields
 
     model_config: SettingsConfigDict = SettingsConfigDict(env_file=".env", case_sensitive=False, extra="ignore")
 
@@ -32,11 +50,7 @@ def get_settings() -> Settings:
 def get_logger() -> logging.Logger:
     settings = get_settings()
 
-    logging.basicConfig(
-        level=settings.LOG_LEVEL.upper(),
-        datefmt="%Y-%m-%d %H:%M:%S",
-        format="%(asctime)s [%(levelname)s] %(message)s",
-    )
+    setup_queue_logging(settings.LOG_LEVEL.upper(), settings.LOG_FORMAT)
     return logging.getLogger("gitlab_dumper")
 
 
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import socket
+import time
+from typing import Iterable
+
+from src._settings import get_logger
+from src._utils import safe_resolve_path
+
+logger = get_logger()
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse shard spec like '2/4' into (index, total), index is 1-based."""
+    try:
+        index, total = map(int, value.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must be passed as i/N, got {value!r}")
+
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError(f"Shard index must be in range 1..N, got {value!r}")
+    return index, total
+
+
+def in_shard(project_id: int, index: int, total: int) -> bool:
+    """Stable project to shard assignment, doesn't depend on listing order or process hash seed."""
+    digest = hashlib.sha1(str(project_id).encode(), usedforsecurity=False).digest()
+    return int.from_bytes(digest[:8], "big") % total == index - 1
+
+
+def worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ClaimQueue:
+    """
+    Work queue over plain (shared) directory. Project is claimed by exclusive creation of a claim file,
+    so several hosts iterating the same listing never dump one project twice.
+    Claims are never expired: runs reusing the directory must pass own run id, claims are kept in <path>/<run id>/.
+    """
+
+    def __init__(self, path: str, run_id: str | None = None) -> None:
+        base_path = safe_resolve_path(path)
+        if run_id:
+            base_path = os.path.join(base_path, run_id)
+        self.path = os.path.join(base_path, "claims")
+        self.worker = worker_id()
+        self.adopted: set[str] = set()
+
+    def adopt(self, workers: Iterable[str]) -> None:
+        """Claims of dead workers, e.g. of the interrupted run being resumed, are taken over on claim."""
+        self.adopted.update(workers)
+
+    def _owner(self, claim_path: str) -> str | None:
+        try:
+            with open(claim_path, "r") as fh:
+                return json.load(fh).get("worker")
+        except (OSError, ValueError):
+            return None
+
+    def _write_claim(self, fd: int) -> None:
+        with os.fdopen(fd, "w") as fh:
+            json.dump({"worker": self.worker, "claimed_at": time.time()}, fh)
+
+    def claim(self, project_id: int) -> bool:
+        """Returns True if project was claimed by this worker."""
+        os.makedirs(self.path, exist_ok=True)
+        claim_path = os.path.join(self.path, str(project_id))
+
+        try:
+            fd = os.open(claim_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            if self._owner(claim_path) not in self.adopted:
+                return False
+            # project was in flight when its worker died, its leftovers are recovered by the dump
+            tmp_path = f"{claim_path}.{self.worker}.tmp"
+            self._write_claim(os.open(tmp_path, os.O_CREAT | os.O_TRUNC | os.O_WRONLY, 0o644))
+            os.replace(tmp_path, claim_path)
+            return True
+
+        self._write_claim(fd)
+        return True
+
+    def release(self, project_id: int) -> None:
+        """Return project to the queue, e.g. after failure, so workers which haven't passed it yet can retry."""
+        claim_path = os.path.join(self.path, str(project_id))
+        if self._owner(claim_path) == self.worker:
+            os.remove(claim_path)
+
+
+__all__ = ["ClaimQueue", "in_shard", "parse_shard", "worker_id"]
@@ -0,0 +1,200 @@
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Iterable, Iterator, Literal, TypeVar
+
+from src._logging import log_context
+from src._utils import safe_resolve_path
+
+if TYPE_CHECKING:
+    from git import Repo as GitRepository
+
+T = TypeVar("T")
+ProjectStatus = Literal["ok", "failed", "skipped", "unchanged"]
+
+
+@dataclass
+class ProjectStats:
+    """Timings and transfer counters of a single project dump."""
+
+    project_id: int = 0
+    path_with_namespace: str = ""
+    mode: str = ""
+    status: ProjectStatus = "ok"
+    durations: dict[str, float] = field(default_factory=dict)
+    bytes: int = 0
+    retries: int = 0
+    error: str | None = None
+
+    @contextmanager
+    def measure(self, phase: str) -> Iterator[None]:
+        """Add duration of block to phase, records logged inside the block are tagged with the phase."""
+        started_at = time.perf_counter()
+        try:
+            with log_context(phase=phase):
+                yield
+        finally:
+            self.durations[phase] = self.durations.get(phase, 0.0) + time.perf_counter() - started_at
+
+    @property
+    def total_duration(self) -> float:
+        return self.durations.get("total", sum(self.durations.values()))
+
+
+@dataclass
+class RunReport:
+    """Dump run telemetry: per-phase durations, bytes, retries and per-project stats."""
+
+    started_at: float = field(default_factory=time.time)
+    finished_at: float | None = None
+    durations: dict[str, float] = field(default_factory=dict)
+    api_requests: int = 0
+    api_retries: int = 0
+    projects: list[ProjectStats] = field(default_factory=list)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(self, stats: ProjectStats) -> None:
+        with self._lock:
+            self.projects.append(stats)
+
+    def timed_iter(self, iterable: Iterable[T], phase: str) -> Iterator[T]:
+        """Iterate over lazy iterable and count time spent waiting for items as phase duration."""
+        iterator = iter(iterable)
+        while True:
+            started_at = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.durations[phase] = self.durations.get(phase, 0.0) + time.perf_counter() - started_at
+            yield item
+
+    def finish(self) -> None:
+        self.finished_at = time.time()
+        self.durations["total"] = self.finished_at - self.started_at
+
+    def count(self, status: ProjectStatus) -> int:
+        return sum(1 for stats in self.projects if stats.status == status)
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(stats.bytes for stats in self.projects)
+
+    @property
+    def throughput(self) -> float:
+        """Average bytes per second over the whole run."""
+        total = self.durations.get("total") or 0
+        return self.total_bytes / total if total else 0.0
+
+    def summary(self) -> dict[str, float | int]:
+        return {
+            "projects_ok": self.count("ok"),
+            "projects_failed": self.count("failed"),
+            "projects_skipped": self.count("skipped") + self.count("unchanged"),
+            "run_duration_seconds": round(self.durations.get("total", 0.0), 3),
+            "listing_duration_seconds": round(self.durations.get("listing", 0.0), 3),
+            "transfer_duration_seconds": round(
+                sum(stats.durations.get("transfer", 0.0) for stats in self.projects), 3
+            ),
+            "bytes_total": self.total_bytes,
+            "throughput_bytes_per_second": round(self.throughput, 1),
+            "api_requests_total": self.api_requests,
+            "api_retries_total": self.api_retries,
+        }
+
+    def slowest(self, limit: int = 10) -> list[ProjectStats]:
+        transferred = (stats for stats in self.projects if stats.status in ("ok", "failed"))
+        return sorted(transferred, key=lambda stats: stats.total_duration, reverse=True)[:limit]
+
+    def write(self, path: str) -> None:
+        """Write run report as CSV (by .csv extension) or JSON."""
+        path = safe_resolve_path(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        if path.endswith(".csv"):
+            self._write_csv(path)
+        else:
+            self._write_json(path)
+
+    def _write_json(self, path: str) -> None:
+        data = {
+            "started_at": datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(timespec="seconds"),
+            "finished_at": (
+                datetime.fromtimestamp(self.finished_at, timezone.utc).isoformat(timespec="seconds")
+                if self.finished_at
+                else None
+            ),
+            "durations": self.durations,
+            "summary": self.summary(),
+            "projects": [asdict(stats) for stats in self.projects],
+        }
+        with open(path, "w") as fh:
+            json.dump(data, fh, indent=2)
+
+    def _write_csv(self, path: str) -> None:
+        phases = sorted({phase for stats in self.projects for phase in stats.durations})
+        with open(path, "w", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(
+                ["project_id", "repo", "mode", "status", "bytes", "retries", *map(lambda p: f"{p}_seconds", phases)]
+                + ["error"]
+            )
+            for stats in self.projects:
+                writer.writerow(
+                    [stats.project_id, stats.path_with_namespace, stats.mode, stats.status, stats.bytes, stats.retries]
+                    + [round(stats.durations.get(phase, 0.0), 3) for phase in phases]
+                    + [stats.error or ""]
+                )
+
+    def write_prometheus(self, path: str, prefix: str = "gitlab_dumper") -> None:
+        """Write metrics in node_exporter textfile collector format, file is replaced atomically."""
+        path = safe_resolve_path(path)
+        summary = self.summary()
+        lines = [
+            f"# HELP {prefix}_last_run_timestamp_seconds Unix time when the last dump finished.",
+            f"# TYPE {prefix}_last_run_timestamp_seconds gauge",
+            f"{prefix}_last_run_timestamp_seconds {self.finished_at or time.time():.0f}",
+            f"# HELP {prefix}_phase_duration_seconds Wall time of dump run phases.",
+            f"# TYPE {prefix}_phase_duration_seconds gauge",
+            *(
+                f'{prefix}_phase_duration_seconds{{phase="{phase}"}} {value:.3f}'
+                for phase, value in self.durations.items()
+            ),
+            f"# HELP {prefix}_projects Number of projects by dump status.",
+            f"# TYPE {prefix}_projects gauge",
+            *(f'{prefix}_projects{{status="{status}"}} {self.count(status)}' for status in ProjectStatus.__args__),
+            f"# HELP {prefix}_bytes Bytes transferred by the last dump.",
+            f"# TYPE {prefix}_bytes gauge",
+            f"{prefix}_bytes {summary['bytes_total']}",
+            f"# HELP {prefix}_api_requests Gitlab API requests made by the last dump.",
+            f"# TYPE {prefix}_api_requests gauge",
+            f"{prefix}_api_requests {summary['api_requests_total']}",
+            f"# HELP {prefix}_api_retries Gitlab API responses retried (429 and 5xx) by the last dump.",
+            f"# TYPE {prefix}_api_retries gauge",
+            f"{prefix}_api_retries {summary['api_retries_total']}",
+        ]
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+def objects_size(repo: "GitRepository") -> int:
+    """
+    Size of loose objects and packs of git repo by 'git count-objects', which stats only object store,
+    so it's cheap for any repo. Objects borrowed from alternates are not counted.
+    """
+    counts = dict(line.split(": ", 1) for line in repo.git.count_objects("-v").splitlines() if ": " in line)
+    # sizes are reported in KiB
+    return (int(counts.get("size", 0)) + int(counts.get("size-pack", 0))) * 1024
+
+
+__all__ = ["ProjectStats", "RunReport", "objects_size"]
@@ -1,4 +1,5 @@
 import os
+from datetime import datetime, timezone
 
 def bytes_to_human(data: int, granularity=1) -> str:
     """Convert bytes to human format with binary prefix."""
@@ -35,4 +36,19 @@ def safe_resolve_path(path: str) -> str:
     return path
 
 
-__all__ = ["bytes_to_human", "safe_resolve_path"]
+def split_csv(value: str | None) -> list[str] | None:
+    """Convert comma-separated CLI option to list of lowercase items."""
+    if value is None:
+        return None
+    return list(map(lambda item: item.strip().lower(), value.split(",")))
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse ISO 8601 datetime from Gitlab API, naive values treated as UTC."""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+__all__ = ["bytes_to_human", "safe_resolve_path", "parse_datetime", "split_csv"]
@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+import os
+import tarfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Iterable, Iterator
+
+from src._manifest import ManifestEntry
+
+from git import Repo as GitRepository
+from git.exc import GitCommandError, InvalidGitRepositoryError, NoSuchPathError
+
+VERIFY_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass(slots=True)
+class VerifyResult:
+    """Result of integrity check of a single dumped project, error is None if check passed."""
+
+    project_id: int
+    path_with_namespace: str
+    error: str | None = None
+    duration: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class _HashingReader:
+    """Read-only file wrapper which feeds SHA256 with every byte read through it."""
+
+    def __init__(self, fh) -> None:
+        self.fh = fh
+        self.digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.fh.read(size)
+        self.digest.update(data)
+        return data
+
+    def drain(self) -> None:
+        for chunk in iter(lambda: self.read(VERIFY_CHUNK_SIZE), b""):
+            pass
+
+
+def _verify_tar(path: str, compressed: bool) -> str:
+    """
+    Single pass over tar archive: hash of raw bytes, decompression and walk of tar members.
+    Reading gzip stream to its end makes GzipFile check CRC and length of the data.
+    """
+    with open(path, "rb") as fh:
+        reader = _HashingReader(fh)
+        stream = gzip.GzipFile(fileobj=reader, mode="rb") if compressed else reader
+        with tarfile.open(fileobj=stream, mode="r|") as archive:
+            for _ in archive:
+                pass
+        for chunk in iter(lambda: stream.read(VERIFY_CHUNK_SIZE), b""):
+            pass
+        reader.drain()
+    return reader.digest.hexdigest()
+
+
+def _verify_zip(path: str) -> str:
+    """Zip needs random access to central directory, so hash and CRC of members are checked in two passes."""
+    with open(path, "rb") as fh:
+        reader = _HashingReader(fh)
+        reader.drain()
+
+    with zipfile.ZipFile(path) as archive:
+        broken_member = archive.testzip()
+    if broken_member is not None:
+        raise zipfile.BadZipFile(f"bad CRC of {broken_member}")
+    return reader.digest.hexdigest()
+
+
+def _verify_archive(entry: ManifestEntry) -> None:
+    if entry.path.endswith(".zip"):
+        checksum = _verify_zip(entry.path)
+    else:
+        checksum = _verify_tar(entry.path, compressed=entry.path.endswith(".gz"))
+
+    if entry.archive_checksum and checksum != entry.archive_checksum:
+        raise ValueError(f"checksum mismatch, expected {entry.archive_checksum}, got {checksum}")
+
+
+def _verify_repo(entry: ManifestEntry) -> None:
+    """Objects reachable from refs must exist, content of blobs isn't rehashed by --connectivity-only."""
+    GitRepository(entry.path).git.fsck("--connectivity-only", "--no-progress")
+
+
+def verify_entry(entry: ManifestEntry) -> VerifyResult:
+    """Check integrity of dumped clone, mirror or archive. Runs in worker process."""
+    started_at = time.monotonic()
+    error = None
+
+    try:
+        if not os.path.exists(entry.path):
+            error = "missing"
+        elif entry.mode == "archive":
+            _verify_archive(entry)
+        else:
+            _verify_repo(entry)
+    except GitCommandError as e:
+        # fsck reports every broken ref, the first line is enough for summary
+        lines = (e.stderr or "").strip().strip("'").splitlines()
+        error = lines[0].removeprefix("stderr: ").strip("'") if lines else f"git fsck exited with {e.status}"
+    except (InvalidGitRepositoryError, NoSuchPathError) as e:
+        error = f"not a git repository: {e}"
+    except (OSError, EOFError, ValueError, tarfile.TarError, zipfile.BadZipFile, gzip.BadGzipFile) as e:
+        error = f"{e.__class__.__name__}: {e}"
+
+    return VerifyResult(entry.project_id, entry.path_with_namespace, error, time.monotonic() - started_at)
+
+
+def verify_entries(entries: Iterable[ManifestEntry], jobs: int | None = None) -> Iterator[VerifyResult]:
+    """
+    Verify entries in parallel worker processes, results are yielded as they complete.
+    fsck and decompression are CPU-bound, so processes are used instead of threads.
+    """
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        futures = [executor.submit(verify_entry, entry) for entry in entries]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+__all__ = ["VerifyResult", "verify_entries", "verify_entry"]
@@ -1,11 +1,11 @@
 import click
-from tabulate import tabulate
+from typing import TYPE_CHECKING, Any
 
-from src._settings import get_settings, get_logger
-from src._gitlab import get_gitlab_client, Group
+from src._output import format_option
+from src._utils import split_csv
 
-logger = get_logger()
-gitlab = get_gitlab_client(get_settings())
+if TYPE_CHECKING:
+    from src._records import GroupRecord
 
 
 @click.group("groups")
@@ -17,51 +17,72 @@ def groups_cli_commands() -> None:
 @click.option("--parents", "parents_only", is_flag=True, default=False, help="Show only parent groups.")
 @click.option("--subgroups", "subgroups", is_flag=True, default=False, help="Also show subgroups.")
 @click.option("--exclude", required=False, type=str, default=None, help="Comma-separated groups to exclude.")
-def list_groups(parents_only: bool, subgroups: bool, exclude: str | None = None) -> None:
+@click.option("--refresh", "refresh", is_flag=True, default=False, help="Refetch listings, ignore metadata cache.")
+@format_option()
+def list_groups(
+    parents_only: bool,
+    subgroups: bool,
+    exclude: str | None = None,
+    refresh: bool = False,
+    output_format: str = "table",
+) -> None:
     """Show available Gitlab groups."""
 
-    if exclude is not None:
-        exclude = list(map(lambda item: item.strip().lower(), exclude.split(",")))
+    from src._gitlab import get_default_gitlab_client
+    from src._output import RecordWriter
 
-    available_groups = gitlab.fetch_available_groups(only_parent_groups=parents_only, exclude=exclude)
+    gitlab = get_default_gitlab_client()
+    exclude = split_csv(exclude)
+    available_groups = gitlab.fetch_available_groups(only_parent_groups=parents_only, exclude=exclude, refresh=refresh)
 
-    def with_subgroup_formatter(group: Group) -> list[str]:
-        subgroups = group.subgroups.list(all=True, iterator=True)
+    def with_subgroup_formatter(group_with_subgroups: tuple["GroupRecord", list["GroupRecord"]]) -> dict[str, Any]:
+        group, subgroups = group_with_subgroups
+        subgroup_paths = [subgroup.path for subgroup in subgroups]
 
-        return [
-            group.id,
-            group.path,
-            group.full_path,
-            ", ".join(map(lambda sg: sg.path, subgroups)) or "—",
-        ]
+        return {
+            "id": group.id,
+            "slug": group.path,
+            "full_path": group.full_path,
+            # jsonl keeps list, columns of other formats are joined
+            "subgroups": subgroup_paths if output_format == "jsonl" else ", ".join(subgroup_paths) or "—",
+        }
 
     if subgroups:
+        fields = ["id", "slug", "full_path", "subgroups"]
         headers = ["id", "slug", "fully qualified slug", "subgroups"]
-        table_data = map(with_subgroup_formatter, available_groups)
+        records = map(with_subgroup_formatter, gitlab.fetch_subgroups(available_groups))
     else:
+        fields = ["id", "slug", "full_path", "url"]
         headers = ["id", "slug", "fully qualified slug", "url"]
-        table_data = map(lambda g: [g.id, g.path, g.full_path, g.web_url], available_groups)
+        records = map(
+            lambda g: {"id": g.id, "slug": g.path, "full_path": g.full_path, "url": g.web_url}, available_groups
+        )
 
-    table = tabulate(table_data, headers=headers)
-
-    click.echo("")
-    click.echo(table)
+    with RecordWriter(fields, output_format, headers=headers) as writer:
+        writer.write_all(records)
 
 
 @groups_cli_commands.command("projects")
 @click.argument("slug")
-def list_group_projects(slug: str) -> None:
+@format_option()
+def list_group_projects(slug: str, output_format: str = "table") -> None:
     """
     List projects in group or subgroup.
     Slug must be passed as fully qualified path.
     """
 
+    from src._gitlab import get_default_gitlab_client
+    from src._output import RecordWriter
+    from src._records import ProjectRecord
+
+    gitlab = get_default_gitlab_client()
     group = gitlab.client.groups.get(slug)
-    group_projects = group.projects.list(all=True, iterator=True)
+    group_projects = map(ProjectRecord.from_attrs, gitlab.paginate(f"/groups/{group.id}/projects", simple=True))
 
+    fields = ["id", "slug", "path_with_namespace", "url"]
     headers = ["id", "slug", "fully qualified slug", "url"]
-    table_data = map(lambda p: [p.id, p.path, p.path_with_namespace, p.web_url], group_projects)
-    table = tabulate(table_data, headers=headers)
-
-    click.echo("")
-    click.echo(table)
+    with RecordWriter(fields, output_format, headers=headers) as writer:
+        writer.write_all(
+            {"id": p.id, "slug": p.path, "path_with_namespace": p.path_with_namespace, "url": p.web_url}
+            for p in group_projects
+        )
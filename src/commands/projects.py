@@ -1,18 +1,15 @@
 import click
-import time
 
-from functools import reduce
-from tabulate import tabulate
-from gitlab.v4.objects import Project
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING
 
-from src._settings import get_settings, get_logger
-from src._gitlab import get_gitlab_client
-from src._git import clone_or_update_repo, save_repo_as_archive
-from src._utils import bytes_to_human
+from src._output import format_option
+from src._utils import bytes_to_human, split_csv
 
-settings = get_settings()
-logger = get_logger()
-gitlab = get_gitlab_client(settings)
+if TYPE_CHECKING:
+    from src._telemetry import RunReport
+
+ACCESS_LEVELS = {"guest": 10, "reporter": 20, "developer": 30, "maintainer": 40, "owner": 50}
 
 
 @click.group("projects")
@@ -22,39 +19,74 @@ def projects_cli_commands() -> None:
 
 @projects_cli_commands.command("list")
 @click.option("--no-personal", "no_personal", is_flag=True, default=False, help="Hide personal user projects.")
-@click.option("--total-size", "total_size", is_flag=True, default=False, help="Calculate total size.")
-def projects_list(no_personal: bool, total_size: bool) -> None:
+@click.option(
+    "--total-size", "total_size", is_flag=True, default=False, help="Calculate total size and size by namespace."
+)
+@click.option("--refresh", "refresh", is_flag=True, default=False, help="Refetch listings, ignore metadata cache.")
+@format_option()
+def projects_list(no_personal: bool, total_size: bool, refresh: bool = False, output_format: str = "table") -> None:
     """Show available Gitlab projects."""
-    available_projects = gitlab.fetch_available_projects(statistics=True, no_personal=no_personal)
-
-    if total_size and not isinstance(available_projects, list):
-        # by default 'fetch_available_projects' returns iterator,
-        # that first iteration processing leaves an empty list
-        # and data not available for next map/filter calls
-        available_projects = list(available_projects)
-
-    def get_project_size(project: Project, as_bytes: bool = False) -> str:
-        size = project.statistics.get("repository_size", 0)
-        if as_bytes:
-            return int(size)
-        return bytes_to_human(size)
-
-    headers = ["repo", "size", "kind", "url"]
-    table_data = map(
-        lambda p: [p.path_with_namespace, get_project_size(p), p.namespace.get("kind", "–"), p.web_url],
-        available_projects,
-    )
-    table = tabulate(table_data, headers=headers)
 
-    click.echo("")
-    click.echo(table)
+    from src._gitlab import get_default_gitlab_client
+    from src._output import RecordWriter
 
-    if total_size:
-        projects_total_size_raw = map(lambda p: get_project_size(p, as_bytes=True), available_projects)
-        project_total_size = bytes_to_human(reduce(lambda a, b: a + b, projects_total_size_raw, 0), granularity=2)
+    gitlab = get_default_gitlab_client()
+    available_projects = gitlab.fetch_available_projects(statistics=True, no_personal=no_personal, refresh=refresh)
+    totals = SizeTotals() if total_size else None
 
-        click.echo("")
-        click.secho(f"Total size: {project_total_size}", fg="cyan")
+    with RecordWriter(["repo", "size", "kind", "url"], output_format) as writer:
+        for project in available_projects:
+            size = project.repository_size or 0
+            if totals is not None:
+                totals.add(project.path_with_namespace, size)
+
+            writer.write(
+                {
+                    "repo": project.path_with_namespace,
+                    # machine readable formats keep raw bytes
+                    "size": size if output_format in ("csv", "jsonl") else bytes_to_human(size),
+                    "kind": project.namespace_kind or "–",
+                    "url": project.web_url,
+                }
+            )
+
+    if totals is not None:
+        # summary of streaming formats goes to stderr, so stdout can be piped as is
+        _echo_size_totals(totals, err=writer.is_streaming)
+
+
+class SizeTotals:
+    """Total size and size by top-level namespace accumulated in a single pass over projects."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.size = 0
+        self.by_namespace: dict[str, list[int]] = {}  # namespace -> [projects, bytes]
+
+    def add(self, path_with_namespace: str, size: int) -> None:
+        self.count += 1
+        self.size += size
+        namespace_totals = self.by_namespace.setdefault(path_with_namespace.split("/", 1)[0], [0, 0])
+        namespace_totals[0] += 1
+        namespace_totals[1] += size
+
+
+def _echo_size_totals(totals: SizeTotals, err: bool = False) -> None:
+    from tabulate import tabulate
+
+    by_namespace = sorted(totals.by_namespace.items(), key=lambda item: item[1][1], reverse=True)
+    click.echo("", err=err)
+    click.echo(
+        tabulate(
+            [[namespace, count, bytes_to_human(size, granularity=2)] for namespace, (count, size) in by_namespace],
+            headers=["namespace", "projects", "size"],
+        ),
+        err=err,
+    )
+    click.echo("", err=err)
+    click.secho(
+        f"Total size: {bytes_to_human(totals.size, granularity=2)} in {totals.count} projects", fg="cyan", err=err
+    )
 
 
 @projects_cli_commands.command("dump")
@@ -63,10 +95,18 @@ def projects_list(no_personal: bool, total_size: bool) -> None:
     "dumps_dir",
     required=False,
     type=str,
-    default=settings.DEFAULT_DUMP_DIR,
-    help=f"Directory for dumps (default: {settings.DEFAULT_DUMP_DIR}).",
+    default=None,
+    help="Directory for dumps (default: DEFAULT_DUMP_DIR setting, ./dumps).",
+)
+@click.option("--delay", required=False, type=int, default=0, hidden=True, help="Deprecated, use --rate-limit.")
+@click.option(
+    "--rate-limit",
+    "rate_limit",
+    required=False,
+    type=click.FloatRange(min=0, min_open=True),
+    default=None,
+    help="Max Gitlab API requests per second, adapts to server limits (default: API_RATE_LIMIT setting, no limit).",
 )
-@click.option("--delay", required=False, type=int, default=0, help="Delay between clones in seconds (default 0).")
 @click.option("--skip-empty", "skip_empty", is_flag=True, default=False, help="Ignore empty projects.")
 @click.option("--no-personal", "no_personal", is_flag=True, default=False, help="Ignore personal user projects.")
 @click.option(
@@ -76,58 +116,421 @@ def projects_list(no_personal: bool, total_size: bool) -> None:
     default=False,
     help="Download projects as tar.gz archive instead clone.",
 )
+@click.option(
+    "--mirror",
+    "mirror",
+    is_flag=True,
+    default=False,
+    help="Keep bare mirrors updated by git fetch --prune instead working tree clones.",
+)
 @click.option("--dry-run", "dry_run", is_flag=True, default=False, help="Safe simulate dump without download/clone.")
 @click.option("--namespaces", required=False, type=str, default=None, help="Comma-separated namespaces to operate.")
 @click.option("--exclude", required=False, type=str, default=None, help="Comma-separated projects (slug) to exclude.")
+@click.option(
+    "--jobs",
+    "-j",
+    "jobs",
+    required=False,
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of projects dumped in parallel (default 1).",
+)
+@click.option(
+    "--api-jobs",
+    "api_jobs",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Max concurrent Gitlab API downloads (default: same as --jobs).",
+)
+@click.option(
+    "--git-jobs",
+    "git_jobs",
+    required=False,
+    type=click.IntRange(min=1),
+    default=None,
+    help="Max concurrent git clones/pulls (default: same as --jobs).",
+)
+@click.option(
+    "--incremental",
+    "incremental",
+    is_flag=True,
+    default=False,
+    help="Skip projects without activity since the last successful dump.",
+)
+@click.option("--refresh", "refresh", is_flag=True, default=False, help="Refetch listings, ignore metadata cache.")
+@click.option("--skip-archived", "skip_archived", is_flag=True, default=False, help="Ignore archived projects.")
+@click.option(
+    "--min-access-level",
+    "min_access_level",
+    required=False,
+    type=click.Choice(list(ACCESS_LEVELS)),
+    default=None,
+    help="Dump only projects where current user has at least this role.",
+)
+@click.option(
+    "--active-since",
+    "active_since",
+    required=False,
+    type=click.DateTime(),
+    default=None,
+    help="Dump only projects with activity after this date (UTC).",
+)
+@click.option(
+    "--report",
+    "report_path",
+    required=False,
+    type=str,
+    default=None,
+    help="Write run report with per-project timings to file (.json or .csv).",
+)
+@click.option(
+    "--prometheus-textfile",
+    "prometheus_textfile",
+    required=False,
+    type=str,
+    default=None,
+    help="Write run metrics in node_exporter textfile collector format.",
+)
+@click.option(
+    "--shard",
+    "shard",
+    required=False,
+    type=str,
+    default=None,
+    help="Dump only i-th of N shards of projects (stable hash of project id), e.g. 2/4.",
+)
+@click.option(
+    "--queue-dir",
+    "queue_dir",
+    required=False,
+    type=str,
+    default=None,
+    help="Shared directory to claim projects from, hosts with the same queue dir never dump one project twice.",
+)
+@click.option(
+    "--run-id",
+    "run_id",
+    required=False,
+    type=str,
+    default=None,
+    help="Keep claims of queue under this id, e.g. date, so the queue dir can be reused by next runs.",
+)
+@click.option(
+    "--order",
+    "order",
+    type=click.Choice(["size", "listing"]),
+    default="size",
+    show_default=True,
+    help="Order of dump: largest repos first (by repository statistics) or as listed by API.",
+)
+@click.option(
+    "--depth",
+    "depth",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Shallow clone with history truncated to N commits, updates keep the same depth.",
+)
+@click.option(
+    "--filter",
+    "blob_filter",
+    type=str,
+    default=None,
+    help="Partial clone filter passed to git, e.g. blob:none.",
+)
+@click.option(
+    "--single-branch",
+    "single_branch",
+    is_flag=True,
+    default=False,
+    help="Clone and update only the default branch.",
+)
+@click.option(
+    "--archive-store",
+    "archive_store",
+    is_flag=True,
+    default=False,
+    help="Keep archives in store by default branch commit, download only changed repos (with --as-archive).",
+)
+@click.option("--keep-last", "keep_last", type=click.IntRange(min=1), default=None, help="Keep N last archives.")
+@click.option(
+    "--keep-daily", "keep_daily", type=click.IntRange(min=1), default=None, help="Keep last archive of N last days."
+)
+@click.option(
+    "--keep-weekly", "keep_weekly", type=click.IntRange(min=1), default=None, help="Keep last archive of N last weeks."
+)
+@click.option(
+    "--resume",
+    "resume",
+    is_flag=True,
+    default=False,
+    help="Continue interrupted dump: listing is loaded from journal, completed projects are skipped.",
+)
+@click.option(
+    "--object-pool",
+    "object_pool",
+    is_flag=True,
+    default=False,
+    help="Share git objects of forks with their upstream through pool repos (git alternates).",
+)
 def projects_dump(
-    dumps_dir: str,
+    dumps_dir: str | None,
     delay: int,
+    rate_limit: float | None,
     skip_empty: bool,
     no_personal: bool,
     as_archive: bool,
+    mirror: bool,
     dry_run: bool,
     namespaces: list[str] | None = None,
     exclude: list[str] | None = None,
+    jobs: int = 1,
+    api_jobs: int | None = None,
+    git_jobs: int | None = None,
+    incremental: bool = False,
+    refresh: bool = False,
+    skip_archived: bool = False,
+    min_access_level: str | None = None,
+    active_since: datetime | None = None,
+    report_path: str | None = None,
+    prometheus_textfile: str | None = None,
+    shard: str | None = None,
+    queue_dir: str | None = None,
+    run_id: str | None = None,
+    order: str = "size",
+    depth: int | None = None,
+    blob_filter: str | None = None,
+    single_branch: bool = False,
+    archive_store: bool = False,
+    keep_last: int | None = None,
+    keep_daily: int | None = None,
+    keep_weekly: int | None = None,
+    resume: bool = False,
+    object_pool: bool = False,
 ) -> None:
     """Download, clone or re-pull all available projects. All flags are optional."""
 
-    if exclude is not None:
-        exclude = list(map(lambda item: item.strip().lower(), exclude.split(",")))
+    from src._archive_store import RetentionPolicy
+    from src._dump import DumpOptions, dump_projects
+    from src._git import CloneOptions
+    from src._gitlab import get_default_gitlab_client
+    from src._settings import get_logger, get_settings
+    from src._shard import parse_shard
+    from src._telemetry import RunReport
+
+    logger = get_logger()
+    gitlab = get_default_gitlab_client()
+    dumps_dir = dumps_dir or get_settings().DEFAULT_DUMP_DIR
+
+    if as_archive and mirror:
+        raise click.UsageError("Options --as-archive and --mirror are mutually exclusive")
 
-    if namespaces is not None:
-        namespaces = list(map(lambda item: item.strip().lower(), namespaces.split(",")))
+    if (as_archive or mirror) and (depth or blob_filter or single_branch):
+        raise click.UsageError("Options --depth, --filter and --single-branch are supported only for clones")
 
-    no_matches = True  # hack: for UX friendly message, cause we works with iterators/generators
-    failed_projects: list[list[str]] = []
+    if as_archive and object_pool:
+        raise click.UsageError("Option --object-pool is supported only for clones and mirrors")
+
+    if (archive_store or keep_last or keep_daily or keep_weekly) and not as_archive:
+        raise click.UsageError("Archive store and retention options require --as-archive")
+
+    if (keep_last or keep_daily or keep_weekly) and not archive_store:
+        raise click.UsageError("Retention options --keep-* require --archive-store")
+
+    if run_id is not None and queue_dir is None:
+        raise click.UsageError("Option --run-id requires --queue-dir")
+
+    if run_id is not None and (run_id in ("", ".", "..") or "/" in run_id):
+        raise click.BadParameter("Run id must be a plain name, e.g. 2024-01-31", param_hint="--run-id")
+
+    try:
+        shard_spec = parse_shard(shard) if shard is not None else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--shard")
+
+    exclude = split_csv(exclude)
+    namespaces = split_csv(namespaces)
+
+    if delay > 0:
+        logger.warning("Option --delay is deprecated and ignored, requests are throttled by adaptive rate limiter")
+
+    if rate_limit is not None:
+        gitlab.limiter.set_max_rate(rate_limit)
+
+    # every worker may hold a connection for archive download or branch lookup at once
+    gitlab.resize_pool(api_jobs or jobs)
+
+    report = RunReport()
+    options = DumpOptions(
+        dumps_dir=dumps_dir,
+        mode="archive" if as_archive else "mirror" if mirror else "clone",
+        dry_run=dry_run,
+        skip_empty=skip_empty,
+        incremental=incremental,
+        jobs=jobs,
+        api_jobs=api_jobs,
+        git_jobs=git_jobs,
+        shard=shard_spec,
+        queue_dir=queue_dir,
+        run_id=run_id,
+        order=order,
+        clone=CloneOptions(depth=depth, blob_filter=blob_filter, single_branch=single_branch),
+        archive_store=archive_store,
+        retention=RetentionPolicy(keep_last=keep_last, keep_daily=keep_daily, keep_weekly=keep_weekly),
+        resume=resume,
+        object_pool=object_pool,
+    )
     all_available_projects = gitlab.fetch_available_projects(
-        exclude=exclude, namespaces=namespaces, no_personal=no_personal
+        exclude=exclude,
+        namespaces=namespaces,
+        statistics=order == "size",
+        no_personal=no_personal,
+        refresh=refresh,
+        archived=False if skip_archived else None,
+        min_access_level=ACCESS_LEVELS[min_access_level] if min_access_level else None,
+        last_activity_after=active_since.replace(tzinfo=timezone.utc) if active_since else None,
     )
 
-    for project in all_available_projects:
-        no_matches = False
-        if project.empty_repo and skip_empty:
-            logger.info(f"Repo {project.path_with_namespace} is empty, ignoring")
-            continue
-
-        try:
-            if as_archive:
-                save_repo_as_archive(project, dumps_base_dir=dumps_dir, dry_run=dry_run)
-            else:
-                clone_or_update_repo(project, dumps_base_dir=dumps_dir, dry_run=dry_run)
-        except Exception as e:
-            error_msg = f"{e.__class__.__name__}: {str(e)}"
-            failed_projects.append([project.path_with_namespace, error_msg])
-
-            logger.error(f"Something went wrong while clone or pull repo {project.path_with_namespace}")
-            logger.exception(e)
-
-        if delay > 0:
-            if dry_run:
-                logger.info(f"Simulate delay for {delay}s before next step")
-            else:
-                logger.info(f"Waiting delay ({delay}s) before next {'download' if as_archive else 'clone'}...")
-                time.sleep(delay)
+    dump_projects(gitlab.client, report.timed_iter(all_available_projects, "listing"), options, report)
+    report.api_requests = gitlab.client.session.requests_total
+    report.api_retries = gitlab.client.session.retries_total
+    report.finish()
+
+    if report_path is not None:
+        report.write(report_path)
 
+    if prometheus_textfile is not None:
+        report.write_prometheus(prometheus_textfile)
+
+    if not report.projects:
+        click.secho("Projects by params not found.", bold=True, fg="yellow")
+        return
+
+    _echo_dump_summary(report)
+
+
+@projects_cli_commands.command("merge-manifests")
+@click.option(
+    "--dumps-dir",
+    "dumps_dir",
+    required=False,
+    type=str,
+    default=None,
+    help="Directory for dumps (default: DEFAULT_DUMP_DIR setting, ./dumps).",
+)
+def projects_merge_manifests(dumps_dir: str | None) -> None:
+    """Merge manifest parts of sharded dump runs into one manifest."""
+    from src._manifest import DumpManifest
+    from src._settings import get_settings
+
+    manifest = DumpManifest(dumps_dir or get_settings().DEFAULT_DUMP_DIR)
+    merged = manifest.merge()
+    click.secho(f"Merged {merged} manifest parts, {len(manifest.entries)} projects in {manifest.path}", fg="cyan")
+
+
+@projects_cli_commands.command("verify")
+@click.option(
+    "--dumps-dir",
+    "dumps_dir",
+    required=False,
+    type=str,
+    default=None,
+    help="Directory for dumps (default: DEFAULT_DUMP_DIR setting, ./dumps).",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of parallel verify processes (default: number of CPU cores).",
+)
+@click.option(
+    "--skip-verified",
+    "skip_verified",
+    is_flag=True,
+    default=False,
+    help="Skip projects which passed verification after their last dump.",
+)
+@click.pass_context
+def projects_verify(ctx: click.Context, dumps_dir: str | None, jobs: int | None, skip_verified: bool) -> None:
+    """Check integrity of dumps from manifest: git fsck of clones, checksum and decompression of archives."""
+    from tabulate import tabulate
+
+    from src._manifest import DumpManifest
+    from src._settings import get_settings
+    from src._verify import verify_entries
+
+    manifest = DumpManifest(dumps_dir or get_settings().DEFAULT_DUMP_DIR)
+    manifest.merge()
+
+    entries = [
+        entry
+        for entry in manifest.entries.values()
+        if not (
+            skip_verified
+            and entry.verified_at
+            and entry.verify_error is None
+            and entry.verified_at >= (entry.dumped_at or "")
+        )
+    ]
+    if not entries:
+        click.secho("Nothing to verify.", bold=True, fg="yellow")
+        return
+
+    failed = []
+    try:
+        for result in verify_entries(entries, jobs=jobs):
+            manifest.record_verification(result.project_id, result.error)
+            if not result.ok:
+                failed.append(result)
+    finally:
+        manifest.save()
+
+    click.secho(f"Verified {len(entries)} projects, {len(failed)} failed", fg="red" if failed else "cyan")
+    if failed:
+        rows = [[result.path_with_namespace, result.error] for result in failed]
+        click.echo("")
+        click.echo(tabulate(sorted(rows), headers=["failed project", "error"]))
+        ctx.exit(1)
+
+
+def _echo_dump_summary(report: "RunReport") -> None:
+    """Print run totals, slowest projects and failed projects tables."""
+    from tabulate import tabulate
+
+    summary = report.summary()
+    totals = [
+        ["projects dumped", summary["projects_ok"]],
+        ["projects skipped", summary["projects_skipped"]],
+        ["projects failed", summary["projects_failed"]],
+        ["run duration", f"{summary['run_duration_seconds']}s"],
+        ["listing duration", f"{summary['listing_duration_seconds']}s"],
+        ["transfer duration (sum)", f"{summary['transfer_duration_seconds']}s"],
+        ["transferred", bytes_to_human(summary["bytes_total"], granularity=2) or "0B"],
+        ["throughput", f"{bytes_to_human(int(summary['throughput_bytes_per_second']), granularity=2) or '0B'}/s"],
+        ["api requests", summary["api_requests_total"]],
+        ["api retries", summary["api_retries_total"]],
+    ]
+    click.echo("")
+    click.echo(tabulate(totals, headers=["run summary", ""]))
+
+    slowest = [
+        [
+            stats.path_with_namespace,
+            f"{stats.total_duration:.2f}s",
+            f"{stats.durations.get('transfer', 0.0):.2f}s",
+            bytes_to_human(stats.bytes) or "0B",
+        ]
+        for stats in report.slowest()
+    ]
+    if slowest:
+        click.echo("")
+        click.echo(tabulate(slowest, headers=["slowest repo", "total", "transfer", "size"]))
+
+    failed_projects = sorted(
+        [stats.path_with_namespace, stats.error] for stats in report.projects if stats.status == "failed"
+    )
     if failed_projects:
         headers = ["repo", "error"]
         table = tabulate(failed_projects, headers=headers)
@@ -136,6 +539,3 @@ def projects_dump(
         click.secho(f"{len(failed_projects)} project has failed", fg="red")
         click.echo("")
         click.echo(table)
-
-    if no_matches:
-        click.secho("Projects by params not found.", bold=True, fg="yellow")
@@ -1,16 +1,82 @@
 import click
+from typing import TYPE_CHECKING, Iterator
 
-from src._settings import get_settings, get_logger
-from src._gitlab import get_gitlab_client, Group, GroupSubgroup
+from src._output import STREAMING_FORMATS, format_option
 
-logger = get_logger()
-gitlab = get_gitlab_client(get_settings())
+if TYPE_CHECKING:
+    from src._gitlab import GitlabClientWrapper
+    from src._records import GroupRecord, ProjectRecord
+
+TREE_FIELDS = ["kind", "id", "parent_id", "path", "full_path"]
 
 
 @click.command("tree")
-def tree() -> None:
+@click.option("--refresh", "refresh", is_flag=True, default=False, help="Refetch listings, ignore metadata cache.")
+@click.option(
+    "--root", "root", required=False, type=str, default=None, help="Show only subtree of group (fully qualified slug)."
+)
+@format_option(default="tree", formats=("tree", *STREAMING_FORMATS))
+def tree(refresh: bool = False, root: str | None = None, output_format: str = "tree") -> None:
     """Show groups, subgroups and projects as tree."""
 
+    from src._gitlab import get_default_gitlab_client
+
+    gitlab = get_default_gitlab_client()
+    namespaces = [root.strip("/").lower()] if root else None
+
+    if output_format == "tree":
+        _echo_tree(gitlab, namespaces, refresh)
+    else:
+        _write_records(gitlab, namespaces, refresh, output_format)
+
+
+def _iter_hierarchy(
+    gitlab: "GitlabClientWrapper", namespaces: list[str] | None, refresh: bool
+) -> Iterator["GroupRecord | ProjectRecord"]:
+    """
+    Groups then projects, both in listing order. Only ids of groups are kept to drop personal projects
+    and projects of hidden groups, so memory doesn't grow with number of projects.
+    """
+    known_groups = set()
+    for group in gitlab.fetch_available_groups(refresh=refresh, namespaces=namespaces):
+        known_groups.add(group.id)
+        yield group
+
+    for project in gitlab.fetch_available_projects(refresh=refresh, namespaces=namespaces, simple=True):
+        if project.namespace_id in known_groups:
+            yield project
+
+
+def _write_records(gitlab: "GitlabClientWrapper", namespaces: list[str] | None, refresh: bool, fmt: str) -> None:
+    """Stream hierarchy as flat records linked by parent_id, groups go before their projects."""
+    from src._output import RecordWriter
+    from src._records import GroupRecord
+
+    with RecordWriter(TREE_FIELDS, fmt) as writer:
+        for item in _iter_hierarchy(gitlab, namespaces, refresh):
+            if isinstance(item, GroupRecord):
+                writer.write(
+                    {
+                        "kind": "group",
+                        "id": item.id,
+                        "parent_id": item.parent_id,
+                        "path": item.path,
+                        "full_path": item.full_path,
+                    }
+                )
+            else:
+                writer.write(
+                    {
+                        "kind": "project",
+                        "id": item.id,
+                        "parent_id": item.namespace_id,
+                        "path": item.path,
+                        "full_path": item.path_with_namespace,
+                    }
+                )
+
+
+def _echo_tree(gitlab: "GitlabClientWrapper", namespaces: list[str] | None, refresh: bool) -> None:
     from treelib import Tree
 
     tree = Tree()
@@ -18,28 +84,24 @@ def tree() -> None:
     projects_counter = 0
     tree.create_node(tag="Gitlab", identifier=root_id)
 
-    def deep_search_projects_in_subgroup(subgroup: GroupSubgroup, parent: Group) -> None:
-        nonlocal projects_counter
-        tree.create_node(tag=subgroup.path, identifier=f"G:{subgroup.id}", parent=f"G:{parent.id}")
-        subgroup_as_group: Group = subgroup.manager.gitlab.groups.get(subgroup.id)
-
-        for project in subgroup_as_group.projects.list(all=True, iterator=True):
-            projects_counter += 1
-            tree.create_node(tag=project.path, identifier=f"P:{project.id}", parent=f"G:{subgroup.id}")
-
-        for nested_subgroup in subgroup_as_group.subgroups.list(all=True, iterator=True):
-            deep_search_projects_in_subgroup(subgroup=nested_subgroup, parent=subgroup)
+    # whole hierarchy is fetched by two bulk listings and linked locally,
+    # parents always go before children cause sorted by depth of full path
+    groups: list["GroupRecord"] = sorted(
+        gitlab.fetch_available_groups(refresh=refresh, namespaces=namespaces), key=lambda g: g.full_path.count("/")
+    )
+    known_groups = {group.id for group in groups}
 
-    for group in gitlab.fetch_available_groups(only_parent_groups=True):
-        tree.create_node(tag=group.path, identifier=f"G:{group.id}", parent=root_id)
+    for group in groups:
+        parent = f"G:{group.parent_id}" if group.parent_id in known_groups else root_id
+        tree.create_node(tag=group.path, identifier=f"G:{group.id}", parent=parent)
 
-        for project in group.projects.list(all=True, iterator=True):
-            if project.namespace.get("id", 0) == group.id:  # ignore projects in subgroups
-                projects_counter += 1
-                tree.create_node(tag=project.path, identifier=f"P:{project.id}", parent=f"G:{group.id}")
+    for project in gitlab.fetch_available_projects(refresh=refresh, namespaces=namespaces, simple=True):
+        namespace_id = project.namespace_id
+        if namespace_id not in known_groups:  # ignore personal projects and projects of hidden groups
+            continue
 
-        for subgroup in group.subgroups.list(all=True, iterator=True):
-            deep_search_projects_in_subgroup(subgroup=subgroup, parent=group)
+        projects_counter += 1
+        tree.create_node(tag=project.path, identifier=f"P:{project.id}", parent=f"G:{namespace_id}")
 
     click.echo(tree)
     click.echo("")
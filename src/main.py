@@ -1,14 +1,54 @@
 import sys
 import click
 
+from importlib import import_module
+
 from src import __version__
-from src._settings import get_settings, get_logger
 
-settings = get_settings()
-logger = get_logger()
+# command name -> (import path, short help), modules are imported only when command is invoked,
+# so --help, --version and shell completion don't pay for python-gitlab, GitPython and pydantic
+LAZY_COMMANDS: dict[str, tuple[str, str]] = {
+    "groups": ("src.commands.groups:groups_cli_commands", "Operations with Gitlab groups."),
+    "projects": ("src.commands.projects:projects_cli_commands", "Operations with Gitlab projects."),
+    "tree": ("src.commands.tree:tree", "Show groups, subgroups and projects as tree."),
+}
+
+
+class LazyGroup(click.Group):
+    """Click group which imports subcommands on first use."""
+
+    def __init__(self, *args, lazy_commands: dict[str, tuple[str, str]] | None = None, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted({*super().list_commands(ctx), *self.lazy_commands})
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.lazy_commands and cmd_name not in self.commands:
+            import_path, _ = self.lazy_commands[cmd_name]
+            module_name, command_name = import_path.split(":")
+            self.add_command(getattr(import_module(module_name), command_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
 
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        """Same as default, but short help of lazy commands is taken from registry without import."""
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.lazy_commands and name not in self.commands:
+                rows.append((name, self.lazy_commands[name][1]))
+                continue
 
-@click.group()
+            command = self.get_command(ctx, name)
+            if command is not None and not command.hidden:
+                rows.append((name, command.get_short_help_str(formatter.width)))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
+
+@click.group(cls=LazyGroup, lazy_commands=LAZY_COMMANDS)
 @click.version_option(__version__)
 def cli() -> None:
     """Gitlab dumper CLI."""
@@ -17,21 +57,16 @@ def cli() -> None:
 def main() -> None:
     """CLI entrypoint."""
     try:
-        from src.commands.projects import projects_cli_commands
-        from src.commands.groups import groups_cli_commands
-        from src.commands.tree import tree
-
-        cli.add_command(projects_cli_commands)
-        cli.add_command(groups_cli_commands)
-        cli.add_command(tree)
         cli()
     except Exception as e:
+        from src._settings import get_settings, get_logger
+
         click.secho(f"{e.__class__.__name__}: {str(e)}", bold=True, fg="red", file=sys.stderr)
         click.echo("")
 
-        match settings.LOG_LEVEL.lower():
+        match get_settings().LOG_LEVEL.lower():
             case "info":
-                logger.exception(e)
+                get_logger().exception(e)
             case "debug":
                 raise
 